@@ -1,18 +1,44 @@
 import os
 from sanic import Sanic, response
+from sanic.log import logger
+from tortoise.exceptions import IntegrityError
 from sanic.response import json
 from sanic_cors import CORS
 from controllers.user_controller import UserController
 from controllers.task_controller import TaskController
-from tortoise import Tortoise
+from controllers.job_controller import JobController
+from controllers.metrics_controller import MetricsController
 from services.task_service import TaskService
 from services.user_service import UserService
 from services.llm_service import LLMService
-from connections.mistral import MistralConnection  # Updated import to use Mistral
-from middleware.auth import auth_middleware
+from services.cache_service import CacheService
+from services.password_hasher import PasswordHasher
+from services.job_service import JobService, MemoryJobStore, RedisJobStore
+from services.metrics import Metrics, default_directory
+from services.prompt_builder import SplitPromptBuilder
+from connections.mistral import (
+    MistralConnection,
+    CircuitBreaker,
+)  # Updated import to use Mistral
+from connections.redis import RedisConnection
+from connections.database import close_database, init_database, observe_queries
+from middleware.auth import auth_middleware, deleted_user_handler
+from middleware.metrics import metrics_request_middleware, metrics_response_middleware
+from middleware.profiling import (
+    profiling_request_middleware,
+    profiling_response_middleware,
+)
+from middleware.query_budget import (
+    query_budget_request_middleware,
+    query_budget_response_middleware,
+    record_query,
+)
+from serializers.task_serializer import dumps
 from config import Config
 
-app = Sanic("AI-TODO-API")
+# Every JSON response is encoded with the fastest backend installed
+app = Sanic("AI-TODO-API", dumps=dumps)
+app.config.GRACEFUL_SHUTDOWN_TIMEOUT = Config.SANIC_GRACEFUL_SHUTDOWN_TIMEOUT
 
 
 os.environ["SANIC_ENV"] = "development"
@@ -20,7 +46,17 @@ os.environ["SANIC_ENV"] = "development"
 # CORS configuration
 CORS_URL = Config.CORS_ORIGIN
 CORS(app, origins=[CORS_URL], supports_credentials=True)
+# Registered before auth_middleware, so rejected requests are measured too
+app.register_middleware(profiling_request_middleware, "request")
+app.register_middleware(metrics_request_middleware, "request")
+app.register_middleware(query_budget_request_middleware, "request")
 app.register_middleware(auth_middleware, "request")
+app.register_middleware(query_budget_response_middleware, "response")
+app.register_middleware(metrics_response_middleware, "response")
+app.register_middleware(profiling_response_middleware, "response")
+
+# Writes for a user deleted since their token was issued fail on a foreign key
+app.error_handler.add(IntegrityError, deleted_user_handler)
 
 
 @app.route("/", methods=["GET"])
@@ -31,40 +67,165 @@ async def hello_world(request):
 # Initialize services on app start and close on shutdown
 @app.listener("before_server_start")
 async def setup_services(app, loop):
-    # Initialize the database connection using Tortoise
-    await Tortoise.init(
-        db_url=Config.DATABASE_URI,
-        modules={"models": ["models.Task", "models.User"]},
-    )
-    await Tortoise.generate_schemas()  # Generate schemas in the database
+    # Every worker runs this listener and opens its own database pool.
+    # The schema is managed by migrate.py, which runs once before the workers start.
+    await init_database()
+
+    # Count the SQL statements of every request against QUERY_BUDGET
+    observe_queries(record_query)
+
+    # Per-worker metrics, added up across workers when /metrics is scraped
+    app.ctx.metrics = None
+    if Config.METRICS_ENABLED and not (Config.METRICS_TOKEN or Config.METRICS_PUBLIC):
+        logger.warning(
+            "Metrics are off: set METRICS_TOKEN, or METRICS_PUBLIC=True to serve "
+            "/metrics without authentication"
+        )
+    elif Config.METRICS_ENABLED:
+        app.ctx.metrics = Metrics(
+            Config.METRICS_DIR or default_directory(), Config.METRICS_FLUSH_INTERVAL
+        )
+        observe_queries(app.ctx.metrics.observe_query)
+        await app.ctx.metrics.start()
 
     # Initialize Mistral Connection for LLM services
-    mistral_connection = MistralConnection(
-        api_key=Config.MISTRAL_API_KEY
-    )  # Using Mistral API Key
+    app.ctx.mistral = mistral_connection = MistralConnection(
+        api_key=Config.MISTRAL_API_KEY,  # Using Mistral API Key
+        model=Config.MISTRAL_MODEL,
+        server_url=Config.MISTRAL_SERVER_URL,
+        timeout=Config.MISTRAL_TIMEOUT,
+        deadline=Config.MISTRAL_DEADLINE,
+        max_retries=Config.MISTRAL_MAX_RETRIES,
+        max_concurrency=Config.MISTRAL_MAX_CONCURRENCY,
+        breaker=CircuitBreaker(
+            failure_threshold=Config.MISTRAL_BREAKER_THRESHOLD,
+            reset_timeout=Config.MISTRAL_BREAKER_RESET,
+        ),
+        metrics=app.ctx.metrics,
+    )
+
+    # Initialize the caches, backed by Redis when it is configured
+    app.ctx.redis = RedisConnection(Config.REDIS_URI) if Config.REDIS_URI else None
+    redis_client = app.ctx.redis.client if app.ctx.redis else None
+
+    app.ctx.cache = None
+    if Config.CACHE_ENABLED:
+        app.ctx.cache = CacheService(
+            redis=redis_client,
+            ttl=Config.CACHE_TTL,
+            local_ttl=Config.CACHE_LOCAL_TTL,
+            local_maxsize=Config.CACHE_LOCAL_MAXSIZE,
+        )
+
+    # LLM responses never change once cached, so the local tier keeps them as long
+    app.ctx.llm_cache = None
+    if Config.LLM_CACHE_ENABLED:
+        app.ctx.llm_cache = CacheService(
+            redis=redis_client,
+            ttl=Config.LLM_CACHE_TTL,
+            local_ttl=Config.LLM_CACHE_TTL,
+            local_maxsize=Config.LLM_CACHE_LOCAL_MAXSIZE,
+            namespace="llm",
+        )
 
     # Initialize LLM service
-    llm_service = LLMService(mistral_connection)
+    llm_service = app.ctx.llm_service = LLMService(
+        mistral_connection, cache=app.ctx.llm_cache
+    )
+
+    # Split prompts stay within a token budget however many subtasks exist
+    app.ctx.prompt_builder = SplitPromptBuilder(
+        max_tokens=Config.SPLIT_PROMPT_MAX_TOKENS,
+        description_chars=Config.SPLIT_PROMPT_DESCRIPTION_CHARS,
+    )
+
+    # Export the hit and miss counts the caches keep
+    if app.ctx.metrics:
+        if app.ctx.cache:
+            app.ctx.metrics.add_stats(
+                "cache_events_total", app.ctx.cache.stats, "event", cache="tasks"
+            )
+        if app.ctx.llm_cache:
+            app.ctx.metrics.add_stats(
+                "cache_events_total", app.ctx.llm_cache.stats, "event", cache="llm"
+            )
+        app.ctx.metrics.add_stats(
+            "llm_cache_requests_total",
+            llm_service.stats,
+            "result",
+            keys=["hits", "coalesced", "misses"],
+        )
+        prompt_builder = app.ctx.prompt_builder
+        app.ctx.metrics.add_stats("split_prompts_total", prompt_builder.calls, "mode")
+        app.ctx.metrics.add_stats(
+            "split_prompt_tokens_total", prompt_builder.tokens, "mode"
+        )
+        app.ctx.metrics.add_stats(
+            "split_prompt_seconds_total", prompt_builder.seconds, "mode"
+        )
+
+    # Hash passwords in a bounded pool instead of on the event loop
+    app.ctx.password_hasher = PasswordHasher(
+        rounds=Config.BCRYPT_ROUNDS,
+        max_workers=Config.BCRYPT_WORKERS,
+        max_pending=Config.BCRYPT_MAX_PENDING,
+    )
 
     # Initialize service instances
-    user_service = UserService()
-    task_service = TaskService(llm_service)
+    user_service = UserService(app.ctx.password_hasher)
+    task_service = TaskService(
+        llm_service, cache=app.ctx.cache, prompt_builder=app.ctx.prompt_builder
+    )
+
+    # Background workers for asynchronous splits; jobs live in Redis when available
+    if app.ctx.redis:
+        job_store = RedisJobStore(
+            app.ctx.redis.client, max_queue=Config.JOB_QUEUE_MAX, ttl=Config.JOB_TTL
+        )
+    else:
+        job_store = MemoryJobStore(max_queue=Config.JOB_QUEUE_MAX)
+    app.ctx.job_service = JobService(
+        task_service, job_store, workers=Config.JOB_WORKERS, lease=Config.JOB_LEASE
+    )
+    await app.ctx.job_service.start()
 
     # Initialize controllers and pass the app and services
     user_controller = UserController(app, user_service)
-    task_controller = TaskController(app, task_service)
+    task_controller = TaskController(app, task_service, app.ctx.job_service)
+    job_controller = JobController(app, app.ctx.job_service)
+    if app.ctx.metrics:
+        metrics_controller = MetricsController(
+            app, app.ctx.metrics, token=Config.METRICS_TOKEN
+        )
+
+
+@app.listener("before_server_stop")
+async def stop_background_jobs(app, loop):
+    # Stop picking up jobs before the connections they need are closed
+    await app.ctx.job_service.stop()
 
 
 @app.listener("after_server_stop")
 async def cleanup_services(app, loop):
-    # Close database connections after the server stops
-    await Tortoise.close_connections()
+    # Close database connections after the server stops, once in-flight queries end
+    await close_database(Config.DB_CLOSE_TIMEOUT)
+
+    if app.ctx.metrics:
+        await app.ctx.metrics.stop()
+
+    if app.ctx.redis:
+        await app.ctx.redis.close()
+
+    await app.ctx.mistral.close()
+
+    app.ctx.password_hasher.shutdown()
 
 
 # Run the app
 if __name__ == "__main__":
     app.run(
-        host="0.0.0.0",
-        port=8000,
-        debug=os.environ.get("SANIC_DEBUG", "False") == "True",
+        host=Config.SANIC_HOST,
+        port=Config.SANIC_PORT,
+        workers=Config.SANIC_WORKERS or os.cpu_count() or 1,
+        debug=Config.SANIC_DEBUG,
     )
@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import re
+import sys
+import time
+from typing import Callable, List
+from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
+from sanic.log import logger
+from config import Config
+
+
+# The client methods sending SQL, wrapped to report every statement
+QUERY_METHODS = (
+    "execute_insert",
+    "execute_many",
+    "execute_query",
+    "execute_query_dict",
+    "execute_script",
+)
+QUERY_OPERATIONS = {"select", "insert", "update", "delete"}
+
+# Literal values, which Tortoise inlines in most statements, and lists of them
+QUERY_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+QUERY_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+# Called with (query, seconds, failed) after every statement
+_query_observers: List[Callable[[str, float, bool], None]] = []
+# Set while a wrapped method runs, so methods calling each other report once
+_in_query = contextvars.ContextVar("in_query", default=False)
+
+
+def tortoise_config() -> dict:
+    """
+    Build the Tortoise configuration of one server worker. On MySQL the worker
+    gets its own aiomysql pool, sized and tuned from Config unless DATABASE_URI
+    sets the same parameters in its query string.
+    """
+    connection = expand_db_url(Config.DATABASE_URI)
+    if connection["engine"] == "tortoise.backends.mysql":
+        credentials = connection["credentials"]
+        credentials.setdefault("minsize", Config.DB_POOL_MINSIZE)
+        credentials.setdefault("maxsize", Config.DB_POOL_MAXSIZE)
+        credentials.setdefault("connect_timeout", Config.DB_CONNECT_TIMEOUT)
+        # Replace pooled connections before MySQL's wait_timeout drops them
+        credentials.setdefault("pool_recycle", Config.DB_POOL_RECYCLE)
+
+    return {
+        "connections": {"default": connection},
+        "apps": {
+            "models": {
+                "models": Config.DATABASE_MODELS,
+                "default_connection": "default",
+            }
+        },
+    }
+
+
+async def init_database() -> None:
+    """
+    Open the database connections of this worker.
+    """
+    await Tortoise.init(config=tortoise_config())
+
+
+async def close_database(timeout: float) -> None:
+    """
+    Close the database connections of this worker, waiting up to 'timeout'
+    seconds for the connections still in use to be given back to the pool.
+    """
+    try:
+        await asyncio.wait_for(Tortoise.close_connections(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"Database connections still in use after {timeout}s, closing anyway"
+        )
+
+
+def observe_queries(observer: Callable[[str, float, bool], None]) -> None:
+    """
+    Call observer(query, seconds, failed) after every SQL statement sent
+    through the default connection, its transactions included. Tortoise must
+    be initialized.
+    """
+    if not _query_observers:
+        client_class = type(connections.get("default"))
+        transaction_class = getattr(
+            sys.modules[client_class.__module__], "TransactionWrapper", None
+        )
+        for cls in (client_class, transaction_class):
+            for name in QUERY_METHODS:
+                if cls is not None and name in cls.__dict__:
+                    setattr(cls, name, _observed(cls.__dict__[name]))
+    _query_observers.append(observer)
+
+
+def _observed(method):
+    async def observed(self, query: str, *args, **kwargs):
+        if _in_query.get():
+            return await method(self, query, *args, **kwargs)
+
+        token = _in_query.set(True)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await method(self, query, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _in_query.reset(token)
+            seconds = time.perf_counter() - started
+            for observer in _query_observers:
+                observer(query, seconds, failed)
+
+    return observed
+
+
+def query_operation(query: str) -> str:
+    """
+    The statement's leading keyword: select, insert, update, delete or other.
+    """
+    operation = query.lstrip()[:6].lower()
+    return operation if operation in QUERY_OPERATIONS else "other"
+
+
+def query_shape(query: str) -> str:
+    """
+    The statement with its literal values replaced by ?, so the queries a loop
+    sends for different rows look the same.
+    """
+    shape = QUERY_LISTS.sub("(...)", QUERY_LITERALS.sub("?", query))
+    return " ".join(shape.split())
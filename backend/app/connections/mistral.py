@@ -1,45 +1,362 @@
-import os
-import json
+import asyncio
+import random
 import re
-from mistralai import Mistral
+import time
+from typing import AsyncIterator, Optional
+from sanic.log import logger
+from services.metrics import Metrics
+
+
+class MistralError(RuntimeError):
+    """
+    A Mistral call failed.
+    """
+
+
+class MistralUnavailableError(MistralError):
+    """
+    Mistral is considered unhealthy or saturated; the call was not attempted.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fail fast after repeated upstream failures, then let a single probe call
+    through once reset_timeout has passed.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Tell whether a call may go upstream now.
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def cancel_probe(self) -> None:
+        """
+        Give the half-open probe slot back when the call never reached upstream.
+        """
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
 
 
 class MistralConnection:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "mistral-large-latest",
+        server_url: Optional[str] = None,
+        timeout: float = 30.0,
+        deadline: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_concurrency: int = 4,
+        breaker: Optional[CircuitBreaker] = None,
+        metrics: Optional[Metrics] = None,
+    ):
         self.api_key = api_key
-        self.client = Mistral(api_key=self.api_key)
+        self.server_url = server_url
+        self.model = model  # The model to use
+        self.timeout = timeout  # Seconds allowed for a single attempt
+        self.deadline = deadline  # Seconds allowed for the call, retries and queueing included
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics  # Call latencies and outcomes, when given
+
+        # Cap the LLM calls in flight from this worker, and reuse their connections
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Created on the first call: importing mistralai and httpx takes longer
+        # than the rest of the app, and most workers never split a task
+        self.http_client = None
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        The Mistral SDK client, sharing one pooled HTTP client for all calls.
+        """
+        if self._client is None:
+            import httpx
+            from mistralai import Mistral
+
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                timeout=self.timeout,
+            )
+            self._client = Mistral(
+                api_key=self.api_key,
+                server_url=self.server_url,
+                async_client=self.http_client,
+            )
+        return self._client
 
     async def ask_mistral(
         self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7
-    ) -> dict:
+    ) -> str:
         """
         Send a prompt to Mistral and get a response in well-formed JSON.
+        Retryable failures (timeouts, connection errors, 429 and 5xx) are retried
+        with jittered exponential backoff until the deadline.
         """
+        started = time.monotonic()
         try:
-            # Prepare the messages for the Mistral chat API
-            messages = [{"role": "user", "content": prompt}]
+            response = await self._ask_with_breaker(prompt)
+        except Exception as e:
+            self._observe_call(started, e)
+            raise
+        self._observe_call(started)
+        return response
 
-            # Make the API request to generate text asynchronously
-            chat_response = await self.client.chat.complete_async(
-                model="mistral-large-latest", messages=messages  # The model to use
+    async def _ask_with_breaker(self, prompt: str) -> str:
+        is_probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise MistralUnavailableError(
+                "Mistral is unavailable, please try again later"
             )
 
-            # Print the response to check its structure
-            print(chat_response)  # Add this line to inspect the response structure
+        try:
+            return await self._ask_with_retries(prompt)
+        finally:
+            # A probe that ended without an upstream verdict (no slot, cancelled)
+            if is_probe:
+                self.breaker.cancel_probe()
 
-            # Assuming chat_response is an object with attributes, access them accordingly:
-            # (This is a guess, you'll need to adjust according to actual structure)
-            if hasattr(chat_response, "choices") and len(chat_response.choices) > 0:
-                generated_text = chat_response.choices[0].message.content
-            else:
-                raise ValueError("Invalid response structure or no choices returned")
+    async def _ask_with_retries(self, prompt: str) -> str:
+        started = time.monotonic()
+        deadline = started + self.deadline
 
-            # Return the response as JSON (already a string, no need to parse again)
-            return self._strip_code_block_markers(generated_text)
+        # Wait for a free slot, but not past the deadline
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.deadline)
+        except asyncio.TimeoutError:
+            raise MistralUnavailableError("Too many LLM calls in flight")
 
-        except Exception as e:
-            # Log the exception and raise a runtime error
-            raise RuntimeError(f"Mistral query failed: {str(e)}")
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                attempt_started = time.monotonic()
+                remaining = deadline - attempt_started
+                try:
+                    generated_text = await asyncio.wait_for(
+                        self._complete(prompt), min(self.timeout, remaining)
+                    )
+                except Exception as e:
+                    retryable = self._is_retryable(e)
+                    self._log_call(attempt, attempt_started, prompt, error=e)
+
+                    backoff = self._backoff(attempt)
+                    out_of_time = time.monotonic() + backoff >= deadline
+                    if not retryable or attempt > self.max_retries or out_of_time:
+                        # A rejected request says nothing of the upstream's health:
+                        # the breaker is left as it is, a probe slot given back
+                        if retryable:
+                            self.breaker.record_failure()
+                        raise MistralError(f"Mistral query failed: {e!r}") from e
+
+                    await asyncio.sleep(backoff)
+                    continue
+
+                self.breaker.record_success()
+                self._log_call(attempt, attempt_started, prompt, total_started=started)
+                return self._strip_code_block_markers(generated_text)
+        finally:
+            self.semaphore.release()
+
+    async def stream_mistral(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream the response to a prompt as text chunks, as Mistral generates it.
+        The call is not retried: chunks may already have been consumed when it fails.
+        Every chunk must arrive within the attempt timeout and the whole stream
+        within the deadline. Code block markers are left in the streamed text.
+        """
+        is_probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise MistralUnavailableError(
+                "Mistral is unavailable, please try again later"
+            )
+
+        started = time.monotonic()
+        deadline = started + self.deadline
+        try:
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.deadline)
+            except asyncio.TimeoutError:
+                raise MistralUnavailableError("Too many LLM calls in flight")
+
+            stream = None
+            try:
+                try:
+                    stream = await asyncio.wait_for(
+                        self.client.chat.stream_async(
+                            model=self.model,
+                            messages=[{"role": "user", "content": prompt}],
+                        ),
+                        self.timeout,
+                    )
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        try:
+                            event = await asyncio.wait_for(
+                                stream.__anext__(), min(self.timeout, remaining)
+                            )
+                        except StopAsyncIteration:
+                            break
+
+                        chunk = self._delta_text(event)
+                        if chunk:
+                            yield chunk
+                except Exception as e:
+                    self._log_call(1, started, prompt, error=e)
+                    # A rejected request leaves the breaker as it is, as in ask_mistral
+                    if self._is_retryable(e):
+                        self.breaker.record_failure()
+                    raise MistralError(f"Mistral stream failed: {e!r}") from e
+
+                self.breaker.record_success()
+                self._log_call(1, started, prompt, total_started=started)
+            finally:
+                if stream is not None:
+                    await stream.aclose()
+                self.semaphore.release()
+        finally:
+            # A probe that ended without an upstream verdict (no slot, abandoned)
+            if is_probe:
+                self.breaker.cancel_probe()
+
+    @staticmethod
+    def _delta_text(event) -> str:
+        """
+        Extract the text added by a streamed completion event.
+        """
+        choices = event.data.choices if event.data else None
+        if not choices or not choices[0].delta:
+            return ""
+
+        content = choices[0].delta.content
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            # Content split into typed chunks, keep the text ones
+            return "".join(getattr(chunk, "text", "") or "" for chunk in content)
+        return ""
+
+    async def _complete(self, prompt: str) -> str:
+        # Prepare the messages for the Mistral chat API
+        messages = [{"role": "user", "content": prompt}]
+
+        # Make the API request to generate text asynchronously
+        chat_response = await self.client.chat.complete_async(
+            model=self.model, messages=messages
+        )
+
+        if chat_response is not None and chat_response.choices:
+            return chat_response.choices[0].message.content
+
+        raise ValueError("Invalid response structure or no choices returned")
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, asyncio.TimeoutError):
+            return True
+
+        # Already imported by the client that raised the error
+        import httpx
+        from mistralai.models import SDKError
+
+        if isinstance(error, httpx.TransportError):
+            return True
+        if isinstance(error, SDKError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        Full-jitter exponential backoff before the next attempt.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _log_call(
+        self,
+        attempt: int,
+        attempt_started: float,
+        prompt: str,
+        error: Optional[Exception] = None,
+        total_started: Optional[float] = None,
+    ) -> None:
+        now = time.monotonic()
+        message = (
+            f"mistral_call model={self.model} attempt={attempt} "
+            f"status={'error' if error else 'ok'} "
+            f"latency_ms={(now - attempt_started) * 1000:.0f} "
+            f"prompt_chars={len(prompt)} breaker={self.breaker.state}"
+        )
+        if total_started is not None:
+            message += f" total_ms={(now - total_started) * 1000:.0f}"
+        if error:
+            logger.warning(f"{message} error={error!r}")
+        else:
+            logger.info(message)
+
+    def _observe_call(self, started: float, error: Optional[Exception] = None) -> None:
+        if self.metrics is None:
+            return
+        if error is None:
+            status = "ok"
+        elif isinstance(error, MistralUnavailableError):
+            status = "unavailable"
+        else:
+            status = "error"
+        labels = (("status", status),)
+        self.metrics.inc("llm_requests_total", labels)
+        self.metrics.observe(
+            "llm_request_duration_seconds", labels, time.monotonic() - started
+        )
+
+    async def close(self) -> None:
+        """
+        Close the pooled HTTP connections, if a call ever opened them.
+        """
+        if self.http_client is not None:
+            await self.http_client.aclose()
 
     def _strip_code_block_markers(self, response: str) -> str:
         """
@@ -0,0 +1,126 @@
+import fnmatch
+import time
+
+
+class RedisConnection:
+    def __init__(self, uri: str):
+        # Imported here, the redis client is only loaded when REDIS_URI is set
+        import redis.asyncio as aioredis
+
+        self.uri = uri
+        self.client = aioredis.from_url(self.uri)
+
+    async def close(self) -> None:
+        """
+        Close the connection pool of the client.
+        """
+        await self.client.aclose()
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the subset of the redis.asyncio API used by the app.
+    Meant for tests, benchmarks and local development without a Redis server.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    async def get(self, key: str):
+        return self._data[key] if self._alive(key) else None
+
+    async def set(self, key: str, value, ex: int = None, nx: bool = False):
+        if nx and self._alive(key):
+            return None
+        self._data[key] = self._encode(value)
+        self._expires.pop(key, None)
+        if ex is not None:
+            self._expires[key] = time.monotonic() + ex
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return deleted
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        value = int(self._data[key]) + amount if self._alive(key) else amount
+        self._data[key] = self._encode(value)
+        return value
+
+    async def sadd(self, key: str, *members) -> int:
+        current = self._data[key] if self._alive(key) else set()
+        added = {self._encode(m) for m in members} - current
+        self._data[key] = current | added
+        return len(added)
+
+    async def smembers(self, key: str) -> set:
+        return set(self._data[key]) if self._alive(key) else set()
+
+    async def lpush(self, key: str, *values) -> int:
+        current = self._data[key] if self._alive(key) else []
+        for value in values:
+            current.insert(0, self._encode(value))
+        self._data[key] = current
+        return len(current)
+
+    async def rpoplpush(self, source: str, destination: str):
+        if not self._alive(source) or not self._data[source]:
+            return None
+        value = self._data[source].pop()
+        await self.lpush(destination, value)
+        return value
+
+    async def lrem(self, key: str, count: int, value) -> int:
+        if not self._alive(key):
+            return 0
+        value = self._encode(value)
+        current = self._data[key]
+        removed = 0
+        while value in current and (count == 0 or removed < abs(count)):
+            current.remove(value)
+            removed += 1
+        return removed
+
+    async def lrange(self, key: str, start: int, end: int) -> list:
+        if not self._alive(key):
+            return []
+        current = self._data[key]
+        return current[start : (end + 1) or None]
+
+    async def llen(self, key: str) -> int:
+        return len(self._data[key]) if self._alive(key) else 0
+
+    async def keys(self, pattern: str = "*") -> list:
+        return [
+            key.encode("utf-8")
+            for key in list(self._data)
+            if self._alive(key) and fnmatch.fnmatchcase(key, pattern)
+        ]
+
+    async def aclose(self) -> None:
+        pass
@@ -0,0 +1,28 @@
+# controllers/job_controller.py
+
+from sanic.response import json
+from sanic.request import Request
+from sanic.response import HTTPResponse
+from services.job_service import JobService
+
+
+class JobController:
+
+    def __init__(self, app, job_service: JobService) -> None:
+        self.app = app  # Inject the app instance into the controller
+        self.job_service = job_service
+
+        # Register routes
+        self.app.add_route(self.get_job, "/jobs/<job_id>", methods=["GET"])
+
+    async def get_job(self, request: Request, job_id: str) -> HTTPResponse:
+        """
+        Report the status of a background job and, once done, its results.
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        job = await self.job_service.get_job(job_id, user_uuid)
+        if not job:
+            return json({"error": "Job not found"}, status=404)
+
+        return json({"job": job}, status=200)
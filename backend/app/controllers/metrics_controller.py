@@ -0,0 +1,34 @@
+# controllers/metrics_controller.py
+
+import hmac
+from sanic.response import json, text
+from sanic.request import Request
+from sanic.response import HTTPResponse
+from services.metrics import Metrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsController:
+
+    def __init__(self, app, metrics: Metrics, token: str = "") -> None:
+        self.app = app  # Inject the app instance into the controller
+        self.metrics = metrics
+        self.token = token  # Bearer token required from scrapers, when set
+
+        # Register routes
+        self.app.add_route(self.get_metrics, "/metrics", methods=["GET"])
+
+    async def get_metrics(self, request: Request) -> HTTPResponse:
+        """
+        Report the metrics of every server worker in the Prometheus text format.
+        The route is exempt from user authentication and requires METRICS_TOKEN
+        as a bearer token, unless the operator opted into METRICS_PUBLIC.
+        """
+        if self.token:
+            expected = f"Bearer {self.token}".encode()
+            provided = request.headers.get("Authorization", "").encode()
+            if not hmac.compare_digest(provided, expected):
+                return json({"error": "Invalid metrics token"}, status=401)
+
+        return text(self.metrics.render(), content_type=CONTENT_TYPE)
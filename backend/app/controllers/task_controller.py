@@ -1,50 +1,74 @@
-from sanic.response import json
-from sanic_openapi import doc
+import json as jsonlib
+from sanic.response import empty, json
 from uuid import UUID
 from services.task_service import TaskService
+from serializers.task_serializer import (
+    ProjectDTO,
+    SearchResultDTO,
+    TaskDetailDTO,
+    dumps,
+    json_default,
+    serialize_task,
+    serialize_tasks,
+)
 from services.llm_service import LLMService
-from models.User import User
-from models.Task import Task
+from services.job_service import JobService
+from connections.mistral import MistralError, MistralUnavailableError
+from models.Task import Task, ROOT_TASK_ID
+from tortoise.expressions import Q
+from config import Config
 from sanic.exceptions import SanicException
 from sanic.request import Request
 from sanic.response import HTTPResponse
 from typing import List, Dict, Optional
 
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 200
+MAX_TREE_DEPTH = 100
+TREE_STREAM_THRESHOLD = 1000  # Trees with more tasks are sent as a chunked stream
+TREE_CHUNK_SIZE = 64 * 1024
+
 
 class TaskController:
 
-    def __init__(self, app, task_service: TaskService) -> None:
+    def __init__(
+        self, app, task_service: TaskService, job_service: Optional[JobService] = None
+    ) -> None:
         self.app = app  # Inject the app instance into the controller
         self.task_service = task_service
+        self.job_service = job_service  # Runs splits in the background when requested
 
         # Register routes
         self.app.add_route(self.create_task, "/tasks", methods=["POST"])
+        self.app.add_route(self.batch_tasks, "/tasks/batch", methods=["POST"])
         self.app.add_route(self.delete_task, "/tasks/<task_id>", methods=["DELETE"])
 
         self.app.add_route(self.get_all_projects, "/projects", methods=["GET"])
+        self.app.add_route(self.search_tasks, "/tasks/search", methods=["GET"])
         self.app.add_route(self.get_task, "/tasks/<task_id>", methods=["GET"])
+        self.app.add_route(self.get_task_tree, "/tasks/<task_id>/tree", methods=["GET"])
+        self.app.add_route(
+            self.get_task_ancestors, "/tasks/<task_id>/ancestors", methods=["GET"]
+        )
 
         self.app.add_route(self.split_task, "/tasks/<task_id>/split", methods=["POST"])
+        self.app.add_route(
+            self.split_task_stream, "/tasks/<task_id>/split/stream", methods=["POST"]
+        )
+        self.app.add_route(
+            self.split_all_subtasks, "/tasks/<task_id>/split/all", methods=["POST"]
+        )
         self.app.add_route(self.edit_task, "/tasks/<task_id>", methods=["PATCH"])
 
-    # TODO: Get rid of this helper function
-    def get_user_by_uuid(self, user_uuid: UUID) -> Optional[User]:
-        """
-        Helper function to retrieve user by UUID.
-        """
-        return User.filter(uuid=user_uuid).first()
-
-    @doc.summary("Get task with subtasks")
-    @doc.description(
-        "Fetch a task by its ID and return all its subtasks with pagination support."
-    )
     async def get_task(self, request: Request, task_id: str) -> HTTPResponse:
         """
         Fetch a task and its subtasks by task ID with pagination.
+        Subtasks are ordered by creation time; pass the returned next_cursor as
+        ?cursor= to fetch the following page.
         """
         user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
 
-        if task_id == "00000000-0000-0000-0000-000000000000":
+        if task_id == ROOT_TASK_ID:
             return json(
                 {"error": "Invalid task ID: Project parent task cannot be accessed."},
                 status=400,
@@ -55,51 +79,172 @@ class TaskController:
         except ValueError:
             return json({"error": "Invalid task ID"}, status=400)
 
-        # Get user by UUID
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
-
         # Fetch the task by UUID
-        task = await self.task_service.get_task_by_id(task_uuid, user)
+        task = await self.task_service.get_task_by_id(task_uuid, user_uuid)
         if not task:
             return json({"error": "Task not found"}, status=404)
 
+        # Answer pollers from the version stamp when nothing changed, only
+        # once the task is known to exist and to belong to the user
+        etag = await self.task_service.get_etag(user_uuid, task_uuid)
+        if self._not_modified(request, etag):
+            return empty(status=304, headers=self._etag_headers(etag))
+
         # Get pagination parameters from the query string
-        page = int(request.args.get("page", 1))  # Default to page 1 if not provided
-        page_size = int(
-            request.args.get("page_size", 10)
-        )  # Default to 10 tasks per page
+        try:
+            page_size = int(
+                request.args.get("page_size", 10)
+            )  # Default to 10 tasks per page
+            page = int(request.args.get("page", 1))  # Default to page 1 if not provided
+        except ValueError:
+            return json({"error": "page and page_size must be integers"}, status=400)
+
+        if page < 1 or page_size < 1 or page_size > MAX_PAGE_SIZE:
+            return json(
+                {
+                    "error": f"page must be at least 1 and page_size between 1 and {MAX_PAGE_SIZE}"
+                },
+                status=400,
+            )
 
-        # Fetch subtasks of the task with pagination
-        subtasks = await self.task_service.get_subtasks(user, task, page, page_size)
+        next_cursor = None
+        if "page" in request.args:
+            # Offset pagination, kept for compatibility
+            subtasks = await self.task_service.get_subtasks(
+                user_uuid, task, page, page_size
+            )
+        else:
+            # Keyset pagination: an empty or missing cursor starts at the first page
+            try:
+                subtasks, next_cursor = await self.task_service.get_subtasks_after(
+                    user_uuid, task, request.args.get("cursor"), page_size
+                )
+            except ValueError as e:
+                return json({"error": str(e)}, status=400)
 
         # Prepare the response data with task and subtasks
-        subtasks_data = [
-            {
-                "uuid": str(subtask.id),
-                "title": subtask.title,
-                "description": subtask.description,
-                "user_id": str(subtask.user_id),
-                "created_at": subtask.created_at.isoformat(),
-            }
-            for subtask in subtasks
-        ]
-
-        task_data = {
-            "uuid": str(task.id),
-            "title": task.title,
-            "description": task.description,
-            "user_id": str(task.user_id),
-            "created_at": task.created_at.isoformat(),
-            "parent_id": str(task.parent_task_id),
-        }
-
-        return json({"task": task_data, "subtasks": subtasks_data}, status=200)
-
-    @doc.summary("Edit a task")
-    @doc.description("Edit the details of an existing task.")
-    @doc.produces({"message": str, "task": dict})
+        subtasks_data = serialize_tasks(subtasks)
+        task_data = serialize_task(task, TaskDetailDTO)
+
+        return json(
+            {"task": task_data, "subtasks": subtasks_data, "next_cursor": next_cursor},
+            status=200,
+            headers=self._etag_headers(etag),
+        )
+
+    async def search_tasks(self, request: Request) -> HTTPResponse:
+        """
+        Find the authenticated user's tasks matching ?q=, every word having to
+        appear as a whole term. Pass the returned next_cursor as ?cursor= to
+        fetch the following page.
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        text = request.args.get("q", "")
+        try:
+            page_size = int(request.args.get("page_size", 10))
+        except ValueError:
+            return json({"error": "page_size must be an integer"}, status=400)
+
+        if page_size < 1 or page_size > MAX_PAGE_SIZE:
+            return json(
+                {"error": f"page_size must be between 1 and {MAX_PAGE_SIZE}"},
+                status=400,
+            )
+
+        try:
+            matches, next_cursor = await self.task_service.search_tasks(
+                user_uuid, text, request.args.get("cursor"), page_size
+            )
+        except ValueError as e:
+            return json({"error": str(e)}, status=400)
+
+        results = [SearchResultDTO.from_match(task, score) for task, score in matches]
+
+        return json({"tasks": results, "next_cursor": next_cursor}, status=200)
+
+    async def get_task_tree(self, request: Request, task_id: str):
+        """
+        Fetch a task and its subtasks at every level, nested under "subtasks".
+        ?max_depth=N limits the levels below the task (0 returns the task alone).
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        if task_id == ROOT_TASK_ID:
+            return json(
+                {"error": "Invalid task ID: Project parent task cannot be accessed."},
+                status=400,
+            )
+
+        try:
+            task_uuid = UUID(task_id)
+        except ValueError:
+            return json({"error": "Invalid task ID"}, status=400)
+
+        try:
+            max_depth = int(request.args.get("max_depth", MAX_TREE_DEPTH))
+        except ValueError:
+            return json({"error": "max_depth must be an integer"}, status=400)
+
+        if max_depth < 0 or max_depth > MAX_TREE_DEPTH:
+            return json(
+                {"error": f"max_depth must be between 0 and {MAX_TREE_DEPTH}"},
+                status=400,
+            )
+
+        tasks = await self.task_service.get_task_tree(task_uuid, user_uuid, max_depth)
+        if not tasks:
+            return json({"error": "Task not found"}, status=404)
+
+        # Parents come before their children, so one pass links every node
+        nodes = {}
+        for task in tasks:
+            if str(task.id) in nodes:
+                continue  # Reached again through a cycle
+            node = serialize_task(task, ProjectDTO).to_dict()
+            node["subtasks"] = []
+            parent = nodes.get(str(task.parent_task_id))
+            if parent is not None:
+                parent["subtasks"].append(node)
+            nodes[str(task.id)] = node
+
+        tree = nodes[str(tasks[0].id)]
+        if len(tasks) <= TREE_STREAM_THRESHOLD:
+            return json(tree, status=200)
+
+        # Encode large trees piece by piece instead of building one huge string
+        response = await request.respond(content_type="application/json")
+        buffer = []
+        buffered = 0
+        for piece in jsonlib.JSONEncoder(default=json_default).iterencode(tree):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= TREE_CHUNK_SIZE:
+                await response.send("".join(buffer))
+                buffer, buffered = [], 0
+        await response.send("".join(buffer))
+        await response.eof()
+
+    async def get_task_ancestors(self, request: Request, task_id: str) -> HTTPResponse:
+        """
+        Fetch the ancestors of a task, project first.
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        try:
+            task_uuid = UUID(task_id)
+        except ValueError:
+            return json({"error": "Invalid task ID"}, status=400)
+
+        task = await self.task_service.get_task_by_id(task_uuid, user_uuid)
+        if not task:
+            return json({"error": "Task not found"}, status=404)
+
+        ancestors = await self.task_service.get_ancestors(task_uuid, user_uuid)
+        response_data = serialize_tasks(ancestors)
+
+        return json(response_data, status=200)
+
     async def edit_task(self, request: Request, task_id: str) -> HTTPResponse:
         """
         Edit an existing task's details like title, description, and parent task.
@@ -116,19 +261,12 @@ class TaskController:
         except ValueError:
             return json({"error": "Invalid task ID"}, status=400)
 
-        # Get the user by UUID
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
-
-        # Fetch the task from the service layer (should be authorized by user context)
-        task = await self.task_service.get_task_by_id(task_uuid, user)
-        if not task:
-            return json({"error": "Task not found"}, status=404)
-
         # Check for parent_uuid and validate it (ensure it's valid or default it)
         if parent_uuid:
-            parent_task = await Task.filter(id=parent_uuid).first()
+            # One of the user's tasks, or the root to make it a project
+            parent_task = await Task.filter(
+                Q(user_id=user_uuid) | Q(id=ROOT_TASK_ID), id=parent_uuid
+            ).first()
             if not parent_task:
                 return json({"error": "Parent task not found"}, status=404)
 
@@ -141,25 +279,22 @@ class TaskController:
         if parent_uuid:
             updated_fields["parent_task"] = parent_task
 
-        # Update the task via the service
-        updated_task = await self.task_service.update_task(task, updated_fields)
+        # Update the task via the service, which reads it fresh from the database
+        try:
+            updated_task = await self.task_service.update_task(
+                task_uuid, user_uuid, updated_fields
+            )
+        except ValueError as e:
+            # Moving the task into its own subtree, or nesting it too deep
+            return json({"error": str(e)}, status=400)
+        if not updated_task:
+            return json({"error": "Task not found"}, status=404)
 
         # Prepare response data for the updated task
-        response_data = {
-            "uuid": str(updated_task.id),
-            "title": updated_task.title,
-            "description": updated_task.description,
-            "user_id": str(updated_task.user.uuid),
-            "created_at": updated_task.created_at.isoformat(),
-        }
+        response_data = serialize_task(updated_task)
 
         return json({"message": "Task updated", "task": response_data}, status=200)
 
-    @doc.summary("Create a task")
-    @doc.description(
-        "Create a new task by providing title, description, and the authenticated user."
-    )
-    @doc.produces({"message": str, "task": dict})
     async def create_task(self, request: Request) -> HTTPResponse:
         """
         Create a new task for the authenticated user, optionally as a subtask.
@@ -174,38 +309,71 @@ class TaskController:
         if not title:
             return json({"error": "Title is required"}, status=400)
 
-        # Get user
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
-
         # If parent_uuid is provided, validate that the parent task exists
         if parent_uuid:
-            parent_task = await Task.filter(id=parent_uuid).first()
+            # One of the user's tasks, or the root to make it a project
+            parent_task = await Task.filter(
+                Q(user_id=user_uuid) | Q(id=ROOT_TASK_ID), id=parent_uuid
+            ).first()
             if not parent_task:
                 return json({"error": "Parent task not found"}, status=404)
         else:
-            parent_uuid = "00000000-0000-0000-0000-000000000000"
+            parent_uuid = ROOT_TASK_ID
 
         # Create the new task
-        task = await self.task_service.create_task(
-            title, description, user, parent_uuid
-        )
+        try:
+            task = await self.task_service.create_task(
+                title, description, user_uuid, parent_uuid
+            )
+        except ValueError as e:
+            return json({"error": str(e)}, status=400)
 
         # Prepare the response data
-        response_data = {
-            "uuid": str(task.id),
-            "title": task.title,
-            "description": task.description,
-            "user_id": str(task.user.uuid),
-            "created_at": task.created_at.isoformat(),
-        }
+        response_data = serialize_task(task)
 
         # Return the response with the created task
         return json({"message": "Task created", "task": response_data}, status=201)
 
-    @doc.summary("Delete a task")
-    @doc.description("Delete a task by its ID for the authenticated user.")
+    async def batch_tasks(self, request: Request) -> HTTPResponse:
+        """
+        Apply many task operations for the authenticated user at once.
+        The body is {"operations": [...]}, each operation being one of:
+          {"op": "create", "title", "description", "parent_uuid"}
+          {"op": "update", "uuid", "title", "description", "parent_uuid"}
+          {"op": "delete", "uuid"}
+        Invalid operations get an error result; the others are all applied.
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        data = request.json or {}
+        operations = data.get("operations") if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return json({"error": "operations must be a non-empty list"}, status=400)
+        if len(operations) > MAX_BATCH_SIZE:
+            return json(
+                {"error": f"A batch holds at most {MAX_BATCH_SIZE} operations"},
+                status=400,
+            )
+
+        results = await self.task_service.apply_batch(user_uuid, operations)
+
+        response_data = []
+        for index, (operation, result) in enumerate(zip(operations, results)):
+            item = {
+                "index": index,
+                "op": operation.get("op") if isinstance(operation, dict) else None,
+                "status": result["status"],
+            }
+            if "error" in result:
+                item["error"] = result["error"]
+            elif item["op"] == "delete":
+                item["uuid"] = str(result["task"].id)
+            else:
+                item["task"] = serialize_task(result["task"])
+            response_data.append(item)
+
+        return json({"results": response_data}, status=200)
+
     async def delete_task(self, request: Request, task_id: str) -> HTTPResponse:
         """
         Delete a task for the authenticated user.
@@ -217,124 +385,40 @@ class TaskController:
         except ValueError:
             return json({"error": "Invalid task ID"}, status=400)
 
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
-
-        deleted = await self.task_service.delete_task(task_uuid, user)
+        deleted = await self.task_service.delete_task(task_uuid, user_uuid)
         if deleted:
             return json({"message": "Task deleted"}, status=200)
 
         return json({"error": "Task not found"}, status=404)
 
-    @doc.summary("Get all projects")
-    @doc.description("Fetch all projects for the authenticated user.")
     async def get_all_projects(self, request: Request) -> HTTPResponse:
         """
         Fetch all tasks for the authenticated user, including subtask count.
         """
         user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
 
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
-
-        tasks = await self.task_service.get_all_projects(user)
-
-        # Assuming tasks is a list of task objects, and each task has a user attribute that needs to be fetched asynchronously
-        response_data: List[Dict[str, str]] = []
-
-        # Use an async for loop to handle the asynchronous task.user call
-        for task in tasks:
-            # Count the subtasks for the current task
-            subtask_count = await Task.filter(parent_task=task).count()
-
-            # Append the task data to the response_data list
-            response_data.append(
-                {
-                    "uuid": str(task.id),
-                    "title": task.title,
-                    "description": task.description,
-                    "user_id": str(task.user_id),  # Ensure user_id is a string
-                    "created_at": task.created_at.isoformat(),
-                    "subtask_count": subtask_count,  # Add the subtask count
-                }
-            )
-
-        return json(response_data, status=200)
-
-    @doc.summary("Get task with subtasks")
-    @doc.description("Fetch a task by its ID and return all its subtasks.")
-    async def get_task(self, request: Request, task_id: str) -> HTTPResponse:
-        """
-        Fetch a task and its subtasks by task ID.
-        """
-        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
-
-        if task_id == "00000000-0000-0000-0000-000000000000":
-            return json(
-                {"error": "Invalid task ID: Project parent task cannot be accessed."},
-                status=400,
-            )
-
-        try:
-            task_uuid = UUID(task_id)
-        except ValueError:
-            return json({"error": "Invalid task ID"}, status=400)
+        # Answer pollers from the version stamp alone when nothing changed
+        etag = await self.task_service.get_etag(user_uuid)
+        if self._not_modified(request, etag):
+            return empty(status=304, headers=self._etag_headers(etag))
 
-        # Get user by UUID
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
+        tasks = await self.task_service.get_all_projects(user_uuid)
 
-        # Fetch the task by UUID
-        task = await self.task_service.get_task_by_id(task_uuid, user)
-        if not task:
-            return json({"error": "Task not found"}, status=404)
+        # Subtask counts come back with the projects, no per-project query needed
+        response_data = serialize_tasks(tasks, ProjectDTO)
 
-        # Fetch subtasks of the task
-        subtasks = await Task.filter(parent_task=task).all()
+        return json(response_data, status=200, headers=self._etag_headers(etag))
 
-        # Prepare the response data with task and subtasks
-        subtasks_data = [
-            {
-                "uuid": str(subtask.id),
-                "title": subtask.title,
-                "description": subtask.description,
-                "user_id": str(subtask.user_id),
-                "created_at": subtask.created_at.isoformat(),
-            }
-            for subtask in subtasks
-        ]
-
-        task_data = {
-            "uuid": str(task.id),
-            "title": task.title,
-            "description": task.description,
-            "user_id": str(task.user_id),
-            "created_at": task.created_at.isoformat(),
-            "parent_id": str(task.parent_task_id),
-        }
-
-        return json({"task": task_data, "subtasks": subtasks_data}, status=200)
-
-    @doc.summary("Split a task into two subtasks")
-    @doc.description(
-        "Use LLM to split a task into two subtasks for the authenticated user."
-    )
     async def split_task(self, request: Request, task_id: str) -> HTTPResponse:
         """
         Split a task into multiple subtasks based on the provided count.
+        With "async": true in the body (or ?async=1), the split is queued and
+        202 is returned with a job to poll at /jobs/<job_id>.
         """
         user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
 
-        # Fetch the user by UUID
-        user = await self.get_user_by_uuid(user_uuid)
-        if not user:
-            return json({"error": "User not found"}, status=404)
-
         # Fetch the task by ID for the user
-        task = await self.task_service.get_task_by_id(task_id, user)
+        task = await self.task_service.get_task_by_id(task_id, user_uuid)
         if not task:
             return json({"error": "Task not found"}, status=404)
 
@@ -350,6 +434,18 @@ class TaskController:
                     status=400,
                 )
 
+            # Opt-in asynchronous mode: queue the split and answer right away
+            run_async = data.get("async") or request.args.get("async") in ("1", "true")
+            if run_async and self.job_service:
+                job = await self.job_service.submit_split(
+                    user_uuid, task.id, num_subtasks
+                )
+                return json(
+                    {"message": "Task split queued", "job": job},
+                    status=202,
+                    headers={"Location": f"/jobs/{job['id']}"},
+                )
+
             # Call the TaskService to split the task into subtasks
             subtasks = await self.task_service.split_task(
                 parent_task=task,  # Pass the task itself as the parent task
@@ -357,27 +453,183 @@ class TaskController:
             )
 
             # Prepare the response with details of the created subtasks
-            created_subtasks = []
-            for subtask in subtasks:
-                created_subtasks.append(
-                    {
-                        "uuid": str(subtask.id),  # Use the task's UUID
-                        "title": subtask.title,  # Subtask title
-                        "description": subtask.description,  # Subtask description
-                        "user_id": str(
-                            subtask.user.uuid
-                        ),  # User ID associated with the subtask
-                        "created_at": subtask.created_at.isoformat(),  # Creation time in ISO format
-                    }
-                )
+            created_subtasks = serialize_tasks(subtasks)
 
             return json(
                 {"message": "Task split successfully", "subtasks": created_subtasks},
                 status=200,
             )
+        except SanicException as e:
+            return json({"error": str(e)}, status=e.status_code)
+        except MistralUnavailableError as e:
+            # The LLM is unhealthy or saturated, the client should retry later
+            return json({"error": str(e)}, status=503)
+        except MistralError as e:
+            return json({"error": str(e)}, status=502)
         except ValueError as e:
             # If there was an issue with the task splitting, handle the exception
             return json({"error": str(e)}, status=400)
         except Exception as e:
             # Catch any other errors and return an appropriate response
             return json({"error": f"Unexpected error: {str(e)}"}, status=500)
+
+    async def split_task_stream(self, request: Request, task_id: str):
+        """
+        Split a task like split_task, but answer with a text/event-stream.
+        Each created subtask is sent as a 'subtask' event, followed by a 'done'
+        event with the number created, or an 'error' event if the split fails.
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        # Fetch the task by ID for the user
+        task = await self.task_service.get_task_by_id(task_id, user_uuid)
+        if not task:
+            return json({"error": "Task not found"}, status=404)
+
+        data = request.json or {}
+        num_subtasks = data.get("count", 2)  # Default to 2 if no count is provided
+        if not isinstance(num_subtasks, int) or num_subtasks < 1 or num_subtasks > 5:
+            return json(
+                {"error": "You can only split the task into 1 to 5 subtasks."},
+                status=400,
+            )
+
+        response = await request.respond(
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+        created = 0
+        subtasks = self.task_service.split_task_stream(
+            parent_task=task, num_subtasks=num_subtasks
+        )
+        try:
+            async for subtask in subtasks:
+                created += 1
+                await self._send_event(response, "subtask", serialize_task(subtask))
+            await self._send_event(response, "done", {"count": created})
+        except Exception as e:
+            await self._send_event(response, "error", self._split_error(e))
+        finally:
+            await subtasks.aclose()
+
+        await response.eof()
+
+    async def split_all_subtasks(self, request: Request, task_id: str):
+        """
+        Split every subtask of a task that has no subtasks yet, up to
+        SPLIT_ALL_MAX_TASKS of them, answering with a text/event-stream.
+        A 'start' event gives the number of tasks to split, then each one gets a
+        'split' event with its new subtasks or a 'failed' event, as they finish,
+        and a 'done' event closes the stream. Split tasks are no longer eligible,
+        so calling again goes on with the next ones.
+        """
+        user_uuid = request.ctx.user_uuid  # Assuming user is authenticated
+
+        if task_id == ROOT_TASK_ID:
+            return json(
+                {"error": "Invalid task ID: Project parent task cannot be accessed."},
+                status=400,
+            )
+
+        task = await self.task_service.get_task_by_id(task_id, user_uuid)
+        if not task:
+            return json({"error": "Task not found"}, status=404)
+
+        data = request.json or {}
+        num_subtasks = data.get("count", 2)  # Default to 2 if no count is provided
+        if not isinstance(num_subtasks, int) or num_subtasks < 1 or num_subtasks > 5:
+            return json(
+                {"error": "You can only split the task into 1 to 5 subtasks."},
+                status=400,
+            )
+
+        tasks = await self.task_service.get_splittable_subtasks(
+            task, limit=Config.SPLIT_ALL_MAX_TASKS
+        )
+
+        response = await request.respond(
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        await self._send_event(response, "start", {"count": len(tasks)})
+
+        split = failed = created = 0
+        results = self.task_service.split_all(
+            tasks, num_subtasks=num_subtasks, concurrency=Config.SPLIT_ALL_CONCURRENCY
+        )
+        try:
+            async for parent, subtasks, error in results:
+                if error:
+                    failed += 1
+                    await self._send_event(
+                        response,
+                        "failed",
+                        {"task_id": str(parent.id), **self._split_error(error)},
+                    )
+                    continue
+
+                split += 1
+                created += len(subtasks)
+                await self._send_event(
+                    response,
+                    "split",
+                    {"task_id": str(parent.id), "subtasks": serialize_tasks(subtasks)},
+                )
+            await self._send_event(
+                response,
+                "done",
+                {"split": split, "failed": failed, "created": created},
+            )
+        except Exception as e:
+            await self._send_event(response, "error", self._split_error(e))
+        finally:
+            await results.aclose()
+
+        await response.eof()
+
+    @staticmethod
+    def _split_error(error: Exception) -> dict:
+        """
+        The message and HTTP status reported for a failed split.
+        """
+        if isinstance(error, MistralUnavailableError):
+            # The LLM is unhealthy or saturated, the client should retry later
+            return {"error": str(error), "status": 503}
+        if isinstance(error, MistralError):
+            return {"error": str(error), "status": 502}
+        if isinstance(error, ValueError):
+            return {"error": str(error), "status": 400}
+        return {"error": f"Unexpected error: {str(error)}", "status": 500}
+
+    @staticmethod
+    def _not_modified(request: Request, etag: Optional[str]) -> bool:
+        """
+        Tell whether the client already holds the representation tagged etag,
+        comparing If-None-Match weakly as RFC 9110 requires for GET.
+        """
+        header = request.headers.get("If-None-Match")
+        if not etag or not header:
+            return False
+
+        opaque = etag.removeprefix("W/")
+        return any(
+            candidate.strip().removeprefix("W/") == opaque
+            for candidate in header.split(",")
+        )
+
+    @staticmethod
+    def _etag_headers(etag: Optional[str]) -> Dict[str, str]:
+        """
+        Headers letting browsers keep the response and revalidate it on every use.
+        """
+        if not etag:
+            return {}
+        return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    @staticmethod
+    async def _send_event(response, event: str, data: dict) -> None:
+        """
+        Write one Server-Sent Event to a streaming response.
+        """
+        await response.send(f"event: {event}\ndata: {dumps(data)}\n\n")
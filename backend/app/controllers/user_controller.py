@@ -1,7 +1,6 @@
 # controllers/user_controller.py
 
 from sanic.response import json
-from sanic_openapi import doc
 from services.user_service import UserService
 from sanic.exceptions import SanicException
 
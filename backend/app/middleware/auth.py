@@ -1,17 +1,27 @@
 # middleware/auth.py
 
+import hashlib
+import time
 import jwt
 from sanic.exceptions import Unauthorized
+from sanic.response import json
 from datetime import datetime
 import os
 from config import Config
+from models.User import User
+from services.cache_service import LRUCache
+
+# Verified tokens, keyed by their SHA-256 digest, mapped to the user UUID they carry.
+# Entries never outlive the token's own expiry.
+verified_tokens = LRUCache(maxsize=Config.JWT_CACHE_SIZE, ttl=Config.JWT_CACHE_TTL)
 
 
 async def auth_middleware(request):
-    exempt_path = "/auth"
+    # /metrics is protected by its own token, see MetricsController
+    exempt_paths = ("/auth", "/metrics")
 
     # Skip middleware for exempt paths
-    if request.path.startswith(exempt_path):
+    if request.path.startswith(exempt_paths):
         return
 
     # Get Authorization header
@@ -25,6 +35,14 @@ async def auth_middleware(request):
         raise Unauthorized("Invalid Authorization header format")
 
     token = token_parts[1]
+
+    # Skip the signature check for tokens verified recently
+    token_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    user_uuid = verified_tokens.get(token_key)
+    if user_uuid is not None:
+        request.ctx.user_uuid = user_uuid
+        return
+
     try:
         # Decode the JWT token (verify signature)
         payload = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
@@ -32,7 +50,24 @@ async def auth_middleware(request):
         # Add user UUID to request context
         request.ctx.user_uuid = payload["uuid"]
 
+        # Remember the token until it expires, at most for JWT_CACHE_TTL seconds
+        if "exp" in payload:
+            ttl = min(payload["exp"] - time.time(), Config.JWT_CACHE_TTL)
+            verified_tokens.set(token_key, payload["uuid"], ttl=ttl)
+
     except jwt.ExpiredSignatureError as e:
         raise Unauthorized(f"Token has expired {e}")
     except jwt.InvalidTokenError:
         raise Unauthorized("Invalid token")
+
+
+async def deleted_user_handler(request, exception):
+    """
+    Answer 401 when a write failed because the user of a still valid token has
+    been deleted: the user is no longer looked up on every request. Any other
+    integrity error is left to the default error handler.
+    """
+    user_uuid = getattr(request.ctx, "user_uuid", None)
+    if user_uuid is not None and not await User.exists(uuid=user_uuid):
+        return json({"error": "User no longer exists"}, status=401)
+    return request.app.error_handler.default(request, exception)
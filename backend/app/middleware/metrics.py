@@ -0,0 +1,35 @@
+# middleware/metrics.py
+
+import time
+
+
+async def metrics_request_middleware(request):
+    metrics = request.app.ctx.metrics
+    if metrics is None:
+        return
+
+    request.ctx.metrics_started = time.perf_counter()
+    metrics.in_flight.add(request)
+
+
+async def metrics_response_middleware(request, response):
+    metrics = request.app.ctx.metrics
+    started = getattr(request.ctx, "metrics_started", None)
+    if metrics is None or started is None:
+        return
+
+    # Streamed responses are timed until their headers are sent
+    metrics.in_flight.discard(request)
+
+    # The route template, not the path, keeps the number of series bounded
+    route = request.uri_template if request.route else "unmatched"
+    status = str(response.status)
+    metrics.inc(
+        "http_requests_total",
+        (("method", request.method), ("route", route), ("status", status)),
+    )
+    metrics.observe(
+        "http_request_duration_seconds",
+        (("method", request.method), ("route", route)),
+        time.perf_counter() - started,
+    )
@@ -0,0 +1,82 @@
+# middleware/profiling.py
+
+import asyncio
+import os
+import re
+import threading
+import time
+from typing import Optional
+from sanic.log import logger
+from config import Config
+from services.profiler import SamplingProfiler, verify_profile_request
+
+# One profile at a time per worker, so samples belong to a single request
+_active: Optional[SamplingProfiler] = None
+
+
+async def profiling_request_middleware(request):
+    global _active
+
+    # Off unless PROFILE_SECRET is set, and then only for signed requests
+    if not Config.PROFILE_SECRET:
+        return
+    header = request.headers.get("X-Profile")
+    if header is None:
+        return
+
+    # The signature covers the query string too
+    path = request.path
+    if request.query_string:
+        path += f"?{request.query_string}"
+    valid = verify_profile_request(
+        header, Config.PROFILE_SECRET, request.method, path, Config.PROFILE_MAX_AGE
+    )
+    if not valid:
+        logger.warning(f"Invalid X-Profile header for {request.method} {request.path}")
+        return
+    if _active is not None and _active.running:
+        logger.warning(
+            f"Profile of {request.method} {request.path} skipped, one is running"
+        )
+        return
+
+    # The request's middleware and handler run in this task; samples of the
+    # worker's other requests are set apart
+    _active = request.ctx.profiler = SamplingProfiler(
+        threading.get_ident(),
+        interval=Config.PROFILE_INTERVAL,
+        max_seconds=Config.PROFILE_MAX_SECONDS,
+        task=asyncio.current_task(),
+    )
+    request.ctx.profiler.start()
+
+
+async def profiling_response_middleware(request, response):
+    profiler = getattr(request.ctx, "profiler", None)
+    if profiler is None:
+        return
+
+    # Streamed responses are profiled until their headers are sent
+    request.ctx.profiler = None
+    profiler.stop()
+
+    route = request.uri_template if request.route else request.path
+    name = "{}-{}-{}-{}.folded".format(
+        int(time.time()),
+        request.method,
+        re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root",
+        request.id,
+    )
+    try:
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(Config.PROFILE_DIR, name), "w") as f:
+            f.write(profiler.folded())
+    except OSError as e:
+        logger.warning(f"Could not save the profile {name}: {e}")
+        return
+
+    response.headers["X-Profile-Id"] = name
+    logger.info(
+        f"profile_saved method={request.method} route={route} "
+        f"samples={sum(profiler.stacks.values())} file={name}"
+    )
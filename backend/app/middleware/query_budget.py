@@ -0,0 +1,70 @@
+# middleware/query_budget.py
+
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Tuple
+from sanic.log import logger
+from connections.database import query_shape
+from config import Config
+
+
+class RequestQueries:
+    """
+    The SQL statements sent while handling one request.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def most_repeated(self) -> Tuple[str, int]:
+        """
+        The statement shape sent most often, and how many times it was sent.
+        """
+        shapes = Counter()
+        for statement, count in self.statements.items():
+            shapes[query_shape(statement)] += count
+        return shapes.most_common(1)[0]
+
+
+# Statements of the request being handled by the current task
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "current_queries", default=None
+)
+
+
+def record_query(query: str, seconds: float, failed: bool) -> None:
+    """
+    Add a statement to the current request, as reported by connections.database.
+    """
+    queries = current_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += seconds
+        queries.statements[query] += 1
+
+
+async def query_budget_request_middleware(request):
+    request.ctx.queries = RequestQueries()
+    current_queries.set(request.ctx.queries)
+
+
+async def query_budget_response_middleware(request, response):
+    queries = getattr(request.ctx, "queries", None)
+    if queries is None:
+        return
+
+    # Streamed responses only account for the statements sent before their headers
+    if Config.QUERY_HEADERS:
+        response.headers["X-Query-Count"] = str(queries.count)
+        response.headers["X-Query-Time-Ms"] = f"{queries.seconds * 1000:.2f}"
+
+    if Config.QUERY_BUDGET and queries.count > Config.QUERY_BUDGET:
+        shape, repeats = queries.most_repeated()
+        route = request.uri_template if request.route else request.path
+        logger.warning(
+            f"query_budget_exceeded method={request.method} route={route} "
+            f"queries={queries.count} budget={Config.QUERY_BUDGET} "
+            f"db_ms={queries.seconds * 1000:.0f} repeated={repeats} sql={shape}"
+        )
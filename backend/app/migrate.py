@@ -0,0 +1,103 @@
+# migrate.py
+#
+# Apply pending schema migrations, then exit:
+#
+#     python migrate.py                 # apply migrations
+#     python migrate.py --check-plans   # also verify the hot task queries use an index (SQLite)
+
+import argparse
+import asyncio
+import sys
+from uuid import uuid4
+from tortoise import Tortoise, connections
+from tortoise.expressions import Q
+from tortoise.functions import Count
+from config import Config
+from migrations import dialect, run_migrations
+from models.Task import Task, ROOT_TASK_ID
+
+
+def hot_queries() -> dict:
+    """
+    The task queries issued on every page load, as built by TaskService.
+    """
+    user_id, parent_id = uuid4(), uuid4()
+    return {
+        "projects": Task.filter(user_id=user_id, parent_task_id=ROOT_TASK_ID)
+        .annotate(counted_subtasks=Count("subtasks"))
+        .group_by("id"),
+        "projects (subtask_count column)": Task.filter(
+            user_id=user_id, parent_task_id=ROOT_TASK_ID
+        ),
+        "subtasks page": Task.filter(user_id=user_id, parent_task_id=parent_id)
+        .order_by("created_at", "id")
+        .limit(11),
+        "subtasks after cursor": Task.filter(user_id=user_id, parent_task_id=parent_id)
+        .filter(
+            Q(created_at__gt="2024-01-01T00:00:00")
+            | Q(created_at="2024-01-01T00:00:00", id__gt=parent_id)
+        )
+        .order_by("created_at", "id")
+        .limit(11),
+        "existing subtasks (split)": Task.filter(parent_task_id=parent_id),
+        "subtree (path range)": Task.filter(
+            path__gte=f"{parent_id.hex}/", path__lt=f"{parent_id.hex}0"
+        ),
+    }
+
+
+async def check_query_plans(conn) -> bool:
+    """
+    Run EXPLAIN QUERY PLAN on every hot query and report those that scan the
+    tasks table or sort their rows instead of reading them from an index.
+    """
+    ok = True
+    for name, query in hot_queries().items():
+        _, rows = await conn.execute_query(f"EXPLAIN QUERY PLAN {query.sql()}")
+        details = [row["detail"] for row in rows]
+        problems = [
+            detail
+            for detail in details
+            if detail.startswith("SCAN") or "FOR ORDER BY" in detail
+        ]
+
+        print(f"{'FAIL' if problems else 'ok'}  {name}")
+        for detail in details:
+            print(f"      {detail}")
+        ok = ok and not problems
+
+    return ok
+
+
+async def main(check_plans: bool) -> int:
+    await Tortoise.init(
+        db_url=Config.DATABASE_URI, modules={"models": Config.DATABASE_MODELS}
+    )
+    try:
+        conn = connections.get("default")
+
+        for version in await run_migrations(conn):
+            print(f"Applied {version}")
+
+        if check_plans:
+            if dialect(conn) != "sqlite":
+                print("--check-plans needs a SQLite DATABASE_URI")
+                return 2
+            if not await check_query_plans(conn):
+                return 1
+
+        return 0
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database migrations.")
+    parser.add_argument(
+        "--check-plans",
+        action="store_true",
+        help="verify with EXPLAIN QUERY PLAN that the hot task queries use an index",
+    )
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.check_plans)))
@@ -0,0 +1,8 @@
+from tortoise import Tortoise
+
+
+async def upgrade(conn):
+    """
+    Create the tables that do not exist yet, from the current models.
+    """
+    await Tortoise.generate_schemas(safe=True)
@@ -0,0 +1,24 @@
+from migrations import column_exists, dialect
+
+
+async def upgrade(conn):
+    """
+    Add the denormalized tasks.subtask_count column and backfill it.
+    """
+    if not await column_exists(conn, "tasks", "subtask_count"):
+        await conn.execute_script(
+            "ALTER TABLE tasks ADD COLUMN subtask_count INT NOT NULL DEFAULT 0"
+        )
+
+    if dialect(conn) == "sqlite":
+        await conn.execute_script(
+            "UPDATE tasks SET subtask_count = ("
+            "SELECT COUNT(*) FROM tasks AS c WHERE c.parent_task_id = tasks.id)"
+        )
+    else:
+        # MySQL cannot read the table being updated in a subquery, join a derived table
+        await conn.execute_script(
+            "UPDATE tasks t LEFT JOIN ("
+            "SELECT parent_task_id, COUNT(*) AS n FROM tasks GROUP BY parent_task_id"
+            ") c ON c.parent_task_id = t.id SET t.subtask_count = COALESCE(c.n, 0)"
+        )
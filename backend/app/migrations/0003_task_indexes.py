@@ -0,0 +1,17 @@
+from migrations import create_index
+
+
+async def upgrade(conn):
+    """
+    Index the hot task lookups: a user's children of a parent in creation order
+    (projects, subtask pages) and children of a parent (subtask counts, split).
+    """
+    await create_index(
+        conn,
+        "tasks",
+        "idx_tasks_user_parent_created",
+        ["user_id", "parent_task_id", "created_at", "id"],
+    )
+    await create_index(
+        conn, "tasks", "idx_tasks_parent_created", ["parent_task_id", "created_at"]
+    )
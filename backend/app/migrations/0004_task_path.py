@@ -0,0 +1,53 @@
+from models.Task import MAX_TASK_DEPTH, PATH_SEGMENT_LENGTH, ROOT_TASK_ID
+from migrations import column_exists, create_index, dialect
+
+
+async def upgrade(conn):
+    """
+    Add the materialized tasks.path column, backfill it from parent_task_id and
+    index it for subtree range scans.
+    """
+    if not await column_exists(conn, "tasks", "path"):
+        await conn.execute_script(
+            "ALTER TABLE tasks ADD COLUMN path "
+            f"VARCHAR({PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH}) NOT NULL DEFAULT ''"
+        )
+
+    # Walk down from the projects (and the tasks orphaned by earlier deletes)
+    if dialect(conn) == "sqlite":
+        await conn.execute_script(
+            "CREATE TEMPORARY TABLE task_paths AS "
+            "WITH RECURSIVE tree (id, path) AS ("
+            "SELECT id, REPLACE(id, '-', '') || '/' FROM tasks "
+            f"WHERE id <> '{ROOT_TASK_ID}' "
+            f"AND (parent_task_id IS NULL OR parent_task_id = '{ROOT_TASK_ID}') "
+            "UNION ALL "
+            "SELECT t.id, tree.path || REPLACE(t.id, '-', '') || '/' "
+            "FROM tasks t JOIN tree ON t.parent_task_id = tree.id "
+            f"WHERE LENGTH(tree.path) < {PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH}"
+            ") SELECT id, path FROM tree"
+        )
+        await conn.execute_script(
+            "UPDATE tasks SET path = ("
+            "SELECT path FROM task_paths WHERE task_paths.id = tasks.id"
+            ") WHERE id IN (SELECT id FROM task_paths)"
+        )
+        await conn.execute_script("DROP TABLE task_paths")
+    else:
+        # MySQL cannot read the table being updated in a subquery, join a derived table
+        await conn.execute_script(
+            "UPDATE tasks t JOIN ("
+            "WITH RECURSIVE tree (id, path) AS ("
+            "SELECT id, CAST(CONCAT(REPLACE(id, '-', ''), '/') AS CHAR("
+            f"{PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH})) FROM tasks "
+            f"WHERE id <> '{ROOT_TASK_ID}' "
+            f"AND (parent_task_id IS NULL OR parent_task_id = '{ROOT_TASK_ID}') "
+            "UNION ALL "
+            "SELECT c.id, CONCAT(tree.path, REPLACE(c.id, '-', ''), '/') "
+            "FROM tasks c JOIN tree ON c.parent_task_id = tree.id "
+            f"WHERE LENGTH(tree.path) < {PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH}"
+            ") SELECT id, path FROM tree"
+            ") p ON p.id = t.id SET t.path = p.path"
+        )
+
+    await create_index(conn, "tasks", "idx_tasks_path", ["path"])
@@ -0,0 +1,66 @@
+from models.Task import SEARCH_BUCKET_DIGITS, SEARCH_ROWID_BITS
+from migrations import dialect, index_exists
+
+
+def search_rowid(row: str) -> str:
+    """
+    SQL computing the full-text index rowid of a tasks row, as search_rowid_range
+    expects it: the leading hex digits of user_id, then the row's own rowid.
+    """
+    bucket = " + ".join(
+        f"(INSTR('0123456789abcdef', SUBSTR({row}.user_id, {i + 1}, 1)) - 1)"
+        f" * {16 ** (SEARCH_BUCKET_DIGITS - 1 - i)}"
+        for i in range(SEARCH_BUCKET_DIGITS)
+    )
+    return f"((({bucket}) << {SEARCH_ROWID_BITS}) + {row}.rowid)"
+
+
+async def upgrade(conn):
+    """
+    Index task titles and descriptions for full-text search: a FULLTEXT index
+    on MySQL, an FTS5 table kept in sync by triggers on SQLite.
+    """
+    if dialect(conn) == "mysql":
+        # InnoDB maintains the index on every write; the first one rebuilds the table
+        if not await index_exists(conn, "tasks", ["title", "description"]):
+            await conn.execute_script(
+                "ALTER TABLE tasks "
+                "ADD FULLTEXT INDEX ft_tasks_search (title, description)"
+            )
+        return
+
+    # Contentless: the text stays in tasks, and the rowids are free to be chosen
+    await conn.execute_script(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+        "title, description, content='')"
+    )
+    await conn.execute_script(
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts (rowid, title, description) "
+        f"VALUES ({search_rowid('new')}, new.title, new.description); "
+        "END"
+    )
+    # Removing a row from a contentless index takes the values it was indexed with
+    await conn.execute_script(
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) "
+        f"VALUES ('delete', {search_rowid('old')}, old.title, old.description); "
+        "END"
+    )
+    await conn.execute_script(
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_update "
+        "AFTER UPDATE OF title, description, user_id ON tasks BEGIN "
+        "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) "
+        f"VALUES ('delete', {search_rowid('old')}, old.title, old.description); "
+        "INSERT INTO tasks_fts (rowid, title, description) "
+        f"VALUES ({search_rowid('new')}, new.title, new.description); "
+        "END"
+    )
+
+    # Index the existing tasks. VACUUM may renumber the rowids of tasks, so
+    # run these two statements again after one.
+    await conn.execute_script("INSERT INTO tasks_fts (tasks_fts) VALUES ('delete-all')")
+    await conn.execute_script(
+        "INSERT INTO tasks_fts (rowid, title, description) "
+        f"SELECT {search_rowid('tasks')}, title, description FROM tasks"
+    )
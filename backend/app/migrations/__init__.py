@@ -0,0 +1,111 @@
+# migrations/__init__.py
+#
+# Versioned schema migrations. Each module named NNNN_description.py defines
+# `async def upgrade(conn)`; applied versions are recorded in schema_migrations.
+# Run them once per deploy with `python migrate.py`, never from the web workers.
+
+import importlib
+import os
+import re
+from typing import List
+from tortoise.transactions import in_transaction
+
+MIGRATION_MODULE = re.compile(r"^(\d{4})_\w+\.py$")
+
+
+def dialect(conn) -> str:
+    """
+    Return the SQL dialect of a Tortoise connection ("mysql" or "sqlite").
+    """
+    return conn.capabilities.dialect
+
+
+async def column_exists(conn, table: str, column: str) -> bool:
+    if dialect(conn) == "sqlite":
+        _, rows = await conn.execute_query(f'PRAGMA table_info("{table}")')
+        return any(row["name"] == column for row in rows)
+
+    _, rows = await conn.execute_query(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        [table, column],
+    )
+    return bool(rows)
+
+
+async def index_exists(conn, table: str, columns: List[str]) -> bool:
+    """
+    Check whether an index on exactly these columns, in this order, exists.
+    Indexes are compared by columns because their names depend on who created them.
+    """
+    if dialect(conn) == "sqlite":
+        _, indexes = await conn.execute_query(f'PRAGMA index_list("{table}")')
+        for index in indexes:
+            _, info = await conn.execute_query(f'PRAGMA index_info("{index["name"]}")')
+            if [row["name"] for row in sorted(info, key=lambda r: r["seqno"])] == columns:
+                return True
+        return False
+
+    _, rows = await conn.execute_query(
+        "SELECT GROUP_CONCAT(column_name ORDER BY seq_in_index) AS index_columns "
+        "FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s GROUP BY index_name",
+        [table],
+    )
+    return any(row["index_columns"] == ",".join(columns) for row in rows)
+
+
+async def create_index(conn, table: str, name: str, columns: List[str]) -> None:
+    """
+    Create an index unless an equivalent one is already there.
+    """
+    if await index_exists(conn, table, columns):
+        return
+
+    column_list = ", ".join(f"`{c}`" if dialect(conn) == "mysql" else f'"{c}"' for c in columns)
+    await conn.execute_script(f"CREATE INDEX {name} ON {table} ({column_list})")
+
+
+def available_migrations() -> List[str]:
+    """
+    List the migration module names, oldest first.
+    """
+    directory = os.path.dirname(__file__)
+    return sorted(
+        name[:-3] for name in os.listdir(directory) if MIGRATION_MODULE.match(name)
+    )
+
+
+async def applied_migrations(conn) -> List[str]:
+    await conn.execute_script(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(255) NOT NULL PRIMARY KEY, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    _, rows = await conn.execute_query("SELECT version FROM schema_migrations")
+    return [row["version"] for row in rows]
+
+
+async def run_migrations(conn) -> List[str]:
+    """
+    Apply every pending migration in order and return the versions applied.
+    """
+    applied = set(await applied_migrations(conn))
+    placeholder = "?" if dialect(conn) == "sqlite" else "%s"
+
+    newly_applied = []
+    for version in available_migrations():
+        if version in applied:
+            continue
+
+        module = importlib.import_module(f"migrations.{version}")
+        # MySQL commits DDL implicitly, so migrations are written to be re-runnable
+        async with in_transaction(conn.connection_name) as tx:
+            await module.upgrade(tx)
+            await tx.execute_query(
+                f"INSERT INTO schema_migrations (version) VALUES ({placeholder})",
+                [version],
+            )
+        newly_applied.append(version)
+
+    return newly_applied
@@ -1,6 +1,38 @@
 from tortoise import fields, models
+from typing import Tuple
 import uuid
 
+# Top-level tasks (projects) hang off this sentinel parent id.
+ROOT_TASK_ID = "00000000-0000-0000-0000-000000000000"
+
+# Every task stores its materialized path: the hex ids of its ancestors, from
+# the project down, then its own, each followed by "/". The subtree of a task
+# is then the range of paths starting with its own.
+PATH_SEGMENT_LENGTH = 33
+MAX_TASK_DEPTH = 23  # Keeps the indexed path within MySQL's index key limit
+
+
+def path_segment(task_id) -> str:
+    """
+    Return the part of a materialized path that stands for the given task.
+    """
+    return uuid.UUID(str(task_id)).hex + "/"
+
+
+# On SQLite, the full-text index keys every task by the bucket of its user (the
+# first hex digits of the user id) followed by the task's rowid, so the matches
+# of one user are read from a single contiguous range of the index.
+SEARCH_BUCKET_DIGITS = 5
+SEARCH_ROWID_BITS = 40
+
+
+def search_rowid_range(user_id) -> Tuple[int, int]:
+    """
+    Return the first and last full-text index rowids of the given user's tasks.
+    """
+    bucket = int(uuid.UUID(str(user_id)).hex[:SEARCH_BUCKET_DIGITS], 16)
+    return bucket << SEARCH_ROWID_BITS, ((bucket + 1) << SEARCH_ROWID_BITS) - 1
+
 
 class Task(models.Model):
     STATUS_CHOICES = [
@@ -21,6 +53,19 @@ class Task(models.Model):
     parent_task = fields.ForeignKeyField(
         "models.Task", related_name="subtasks", null=True, on_delete=fields.SET_NULL
     )  # Self-referencing field to link parent task
+    subtask_count = fields.IntField(
+        default=0
+    )  # Denormalized number of direct subtasks, kept in sync by TaskService
+    path = fields.CharField(
+        max_length=PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH, default=""
+    )  # Materialized path of the task in the hierarchy, kept in sync by TaskService
 
     class Meta:
         table = "tasks"
+        # Also created on existing databases by migrations/0003_task_indexes.py
+        # and migrations/0004_task_path.py
+        indexes = (
+            ("user_id", "parent_task_id", "created_at", "id"),
+            ("parent_task_id", "created_at"),
+            ("path",),
+        )
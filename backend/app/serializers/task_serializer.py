@@ -0,0 +1,170 @@
+# serializers/task_serializer.py
+#
+# One place to turn tasks into JSON for the API. DTOs copy column attributes
+# only (user_id, parent_task_id), so serializing never loads a related row,
+# and keep UUIDs and datetimes as they are: orjson encodes them natively.
+
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Type, TypeVar
+from uuid import UUID
+from models.Task import Task
+
+
+@dataclass
+class TaskDTO:
+    """
+    A task as sent to clients.
+    """
+
+    __slots__ = ("uuid", "title", "description", "user_id", "created_at")
+    uuid: UUID
+    title: str
+    description: Optional[str]
+    user_id: UUID
+    created_at: datetime
+
+    @classmethod
+    def from_task(cls, task: Task) -> "TaskDTO":
+        return cls(task.id, task.title, task.description, task.user_id, task.created_at)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in DTO_FIELDS[type(self)]}
+
+
+@dataclass
+class ProjectDTO(TaskDTO):
+    """
+    A task listed with the number of its direct subtasks.
+    """
+
+    __slots__ = ("subtask_count",)
+    subtask_count: int
+
+    @classmethod
+    def from_task(cls, task: Task) -> "ProjectDTO":
+        return cls(
+            task.id,
+            task.title,
+            task.description,
+            task.user_id,
+            task.created_at,
+            task.subtask_count,
+        )
+
+
+@dataclass
+class TaskDetailDTO(TaskDTO):
+    """
+    A task shown on its own, with the id of its parent.
+    """
+
+    __slots__ = ("parent_id",)
+    parent_id: UUID
+
+    @classmethod
+    def from_task(cls, task: Task) -> "TaskDetailDTO":
+        return cls(
+            task.id,
+            task.title,
+            task.description,
+            task.user_id,
+            task.created_at,
+            task.parent_task_id,
+        )
+
+
+@dataclass
+class SearchResultDTO(TaskDetailDTO):
+    """
+    A task found by a search, with its relevance score (higher is better).
+    """
+
+    __slots__ = ("score",)
+    score: float
+
+    @classmethod
+    def from_match(cls, task: Task, score: float) -> "SearchResultDTO":
+        return cls(
+            task.id,
+            task.title,
+            task.description,
+            task.user_id,
+            task.created_at,
+            task.parent_task_id,
+            score,
+        )
+
+
+# Field names of every DTO, in output order, computed once
+DTO_FIELDS = {
+    dto: tuple(
+        field
+        for klass in reversed(dto.__mro__)
+        for field in getattr(klass, "__slots__", ())
+    )
+    for dto in (TaskDTO, ProjectDTO, TaskDetailDTO, SearchResultDTO)
+}
+
+DTO = TypeVar("DTO", bound=TaskDTO)
+
+
+def serialize_task(task: Task, dto: Type[DTO] = TaskDTO) -> DTO:
+    """
+    Convert one task into a DTO, ready to be encoded by dumps().
+    """
+    return dto.from_task(task)
+
+
+def serialize_tasks(tasks: Iterable[Task], dto: Type[DTO] = TaskDTO) -> List[DTO]:
+    """
+    Convert a list of tasks into DTOs, ready to be encoded by dumps().
+    """
+    from_task = dto.from_task
+    return [from_task(task) for task in tasks]
+
+
+def json_default(value):
+    """
+    Encode the values the JSON backends do not know about.
+    """
+    if isinstance(value, TaskDTO):
+        return value.to_dict()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Pick the fastest JSON encoder installed; ujson is pinned in requirements.txt
+try:
+    import orjson
+
+    JSON_BACKEND = "orjson"
+
+    def dumps(value, **kwargs) -> str:
+        return orjson.dumps(value, default=json_default).decode("utf-8")
+
+except ImportError:
+    try:
+        import ujson
+
+        JSON_BACKEND = "ujson"
+
+        def dumps(value, **kwargs) -> str:
+            return ujson.dumps(
+                value,
+                ensure_ascii=False,
+                escape_forward_slashes=False,
+                default=json_default,
+            )
+
+    except ImportError:
+        JSON_BACKEND = "json"
+
+        def dumps(value, **kwargs) -> str:
+            return json.dumps(
+                value, ensure_ascii=False, separators=(",", ":"), default=json_default
+            )
@@ -0,0 +1,281 @@
+# services/cache_service.py
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+from sanic.log import logger
+
+
+class LRUCache:
+    """
+    A bounded in-process cache with a per-entry time to live.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached value, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        # Mark the entry as most recently used
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry when full.
+        """
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheService:
+    """
+    Two-tier read-through cache: an in-process LRU in front of Redis.
+
+    Values must be JSON serializable. Entries can be attached to tags so that
+    every entry derived from the same row can be invalidated at once.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        ttl: int = 60,
+        local_ttl: float = 5.0,
+        local_maxsize: int = 1024,
+        namespace: str = "cache",
+        version_ttl: int = 86400,
+    ):
+        self.redis = redis  # Any client exposing the redis.asyncio API, or None
+        self.ttl = ttl
+        self.local = LRUCache(maxsize=local_maxsize, ttl=min(local_ttl, ttl))
+        self.namespace = namespace
+        self.version_ttl = version_ttl
+
+        # Version stamps live in Redis when it is configured, so every worker sees them
+        self._versions = LRUCache(maxsize=4 * local_maxsize, ttl=version_ttl)
+
+        # Generation of each tag, bumped on invalidation, likewise
+        self._generations = LRUCache(maxsize=4 * local_maxsize, ttl=version_ttl)
+
+        # Keys attached to each tag in the local tier
+        self._local_tags: Dict[str, set] = {}
+
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _version_key(self, key: str) -> str:
+        return f"{self.namespace}:version:{key}"
+
+    def _generation_key(self, tag: str) -> str:
+        return f"{self.namespace}:generation:{tag}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Look a key up in the local tier, then in Redis. Returns None on a miss.
+        """
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["local_hits"] += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._key(key))
+            except Exception as e:
+                logger.warning(f"Cache read failed for {key}: {e}")
+                raw = None
+
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self.stats["redis_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        since: Optional[list] = None,
+    ) -> None:
+        """
+        Store a value in both tiers and attach it to the given tags.
+        With 'since', the generations of the tags read before the value was
+        loaded, the value is dropped again if one of its tags was invalidated
+        meanwhile: it may have been loaded before the write that invalidated it.
+        """
+        tags = list(tags)
+
+        # Tag bookkeeping outlives evicted entries; start over once it grows too big
+        if len(self._local_tags) > 4 * self.local.maxsize:
+            self._local_tags.clear()
+            self.local.clear()
+
+        self.local.set(key, value)
+        for tag in tags:
+            self._local_tags.setdefault(tag, set()).add(key)
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._key(key), json.dumps(value), ex=self.ttl)
+                for tag in tags:
+                    await self.redis.sadd(self._tag_key(tag), key)
+                    await self.redis.expire(self._tag_key(tag), self.ttl)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {key}: {e}")
+
+        # Checked once stored: an invalidation coming later deletes it anyway
+        if since is not None and await self.generations(tags) != since:
+            await self.delete(key)
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._key(key))
+            except Exception as e:
+                logger.warning(f"Cache delete failed for {key}: {e}")
+
+    async def generations(self, tags: Iterable[str]) -> Optional[list]:
+        """
+        Return the generation of each tag, bumped whenever the tag is invalidated,
+        to pass to set() as 'since'. Returns None when Redis cannot be reached.
+        """
+        tags = list(tags)
+        if self.redis is None:
+            return [self._generations.get(tag) for tag in tags]
+
+        try:
+            raw = await self.redis.mget([self._generation_key(tag) for tag in tags])
+            return [int(value) if value is not None else None for value in raw]
+        except Exception as e:
+            logger.warning(f"Generation read failed for {tags}: {e}")
+            return None
+
+    async def invalidate_tags(self, *tags: str) -> None:
+        """
+        Drop every entry attached to any of the given tags from both tiers.
+        The tags' generations are bumped first, so that a value loaded before
+        the invalidation and stored during it is dropped by set().
+        """
+        for tag in tags:
+            if self.redis is None:
+                self._generations.set(tag, time.time_ns())
+                continue
+            try:
+                generation_key = self._generation_key(tag)
+                await self.redis.incr(generation_key)
+                await self.redis.expire(generation_key, self.version_ttl)
+            except Exception as e:
+                logger.warning(f"Generation bump failed for tag {tag}: {e}")
+
+        for tag in tags:
+            self.stats["invalidations"] += 1
+
+            for key in self._local_tags.pop(tag, ()):
+                self.local.delete(key)
+
+            if self.redis is None:
+                continue
+
+            try:
+                members = await self.redis.smembers(self._tag_key(tag))
+                keys = [
+                    self._key(m.decode() if isinstance(m, bytes) else m)
+                    for m in members
+                ]
+                await self.redis.delete(self._tag_key(tag), *keys)
+            except Exception as e:
+                logger.warning(f"Cache invalidation failed for tag {tag}: {e}")
+
+    async def get_version(self, key: str) -> Optional[int]:
+        """
+        Return the version stamp of a key, starting one when it has none.
+        Returns None when Redis cannot be reached.
+        """
+        if self.redis is None:
+            version = self._versions.get(key)
+            if version is None:
+                version = time.time_ns()
+                self._versions.set(key, version)
+            return version
+
+        try:
+            version_key = self._version_key(key)
+            raw = await self.redis.get(version_key)
+            if raw is None:
+                # Another worker may start it at the same time, keep whichever came first
+                await self.redis.set(
+                    version_key, time.time_ns(), nx=True, ex=self.version_ttl
+                )
+                raw = await self.redis.get(version_key)
+            return int(raw) if raw is not None else None
+        except Exception as e:
+            logger.warning(f"Version read failed for {key}: {e}")
+            return None
+
+    async def bump_versions(self, *keys: str) -> None:
+        """
+        Stamp the given keys with a new version after their data changed.
+        """
+        version = time.time_ns()
+        for key in keys:
+            if self.redis is None:
+                self._versions.set(key, version)
+                continue
+
+            try:
+                await self.redis.set(self._version_key(key), version, ex=self.version_ttl)
+            except Exception as e:
+                logger.warning(f"Version bump failed for {key}: {e}")
+
+    def is_settled(self, version: int) -> bool:
+        """
+        Tell whether every local tier entry read before the given version has
+        expired, with a second to spare for clock drift between workers.
+        """
+        return time.time_ns() - version > (self.local.ttl + 1) * 1e9
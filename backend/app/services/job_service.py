@@ -0,0 +1,292 @@
+# services/job_service.py
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+from sanic.exceptions import ServiceUnavailable
+from sanic.log import logger
+from services.task_service import TaskService
+from serializers.task_serializer import json_default, serialize_tasks
+
+
+class MemoryJobStore:
+    """
+    Keep jobs in the worker's memory. Jobs are lost when the worker restarts.
+    """
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self._jobs = {}
+        self._active = {}  # Job currently queued or running for each dedupe key
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def save(self, job: dict) -> None:
+        self._jobs[job["id"]] = dict(job)
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def claim(self, key: str, job_id: str) -> Optional[str]:
+        """
+        Mark job_id as the active job for key, or return the job already active.
+        """
+        if key in self._active:
+            return self._active[key]
+        self._active[key] = job_id
+        return None
+
+    async def release(self, key: str, job_id: str) -> None:
+        if self._active.get(key) == job_id:
+            del self._active[key]
+
+    async def queue_length(self) -> int:
+        return self._queue.qsize()
+
+    async def enqueue(self, job_id: str) -> None:
+        self._queue.put_nowait(job_id)
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ack(self, job_id: str) -> None:
+        pass
+
+    async def recover(self, lease: float) -> None:
+        pass
+
+
+class RedisJobStore:
+    """
+    Keep jobs and their queue in Redis so they are shared by every worker and
+    picked up again when the worker running them dies.
+    """
+
+    def __init__(self, redis, max_queue: int, ttl: int, namespace: str = "jobs"):
+        self.redis = redis
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self.namespace = namespace
+        self.queue_key = f"{namespace}:queue"
+        self.processing_key = f"{namespace}:processing"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.namespace}:job:{job_id}"
+
+    def _active_key(self, key: str) -> str:
+        return f"{self.namespace}:active:{key}"
+
+    async def save(self, job: dict) -> None:
+        await self.redis.set(
+            self._job_key(job["id"]), json.dumps(job, default=json_default), ex=self.ttl
+        )
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        raw = await self.redis.get(self._job_key(job_id))
+        return json.loads(raw) if raw else None
+
+    async def claim(self, key: str, job_id: str) -> Optional[str]:
+        if await self.redis.set(self._active_key(key), job_id, nx=True, ex=self.ttl):
+            return None
+
+        existing = await self.redis.get(self._active_key(key))
+        if existing is None:
+            # The active job finished in between, try again
+            return await self.claim(key, job_id)
+        return existing.decode() if isinstance(existing, bytes) else existing
+
+    async def release(self, key: str, job_id: str) -> None:
+        existing = await self.redis.get(self._active_key(key))
+        if existing is not None and self._decode(existing) == job_id:
+            await self.redis.delete(self._active_key(key))
+
+    async def queue_length(self) -> int:
+        return await self.redis.llen(self.queue_key)
+
+    async def enqueue(self, job_id: str) -> None:
+        await self.redis.lpush(self.queue_key, job_id)
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        """
+        Move the oldest queued job to the processing list, polling until timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = await self.redis.rpoplpush(self.queue_key, self.processing_key)
+            if job_id is not None:
+                return self._decode(job_id)
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(min(0.5, timeout))
+
+    async def ack(self, job_id: str) -> None:
+        await self.redis.lrem(self.processing_key, 0, job_id)
+
+    async def recover(self, lease: float) -> None:
+        """
+        Requeue jobs whose worker stopped renewing their lease, e.g. after a restart.
+        """
+        for raw_id in await self.redis.lrange(self.processing_key, 0, -1):
+            job_id = self._decode(raw_id)
+            job = await self.load(job_id)
+
+            if job is None or job["status"] in ("succeeded", "failed"):
+                await self.ack(job_id)
+            elif time.time() - job.get("heartbeat_at", job["created_at"]) > lease:
+                if await self.redis.lrem(self.processing_key, 1, job_id):
+                    logger.info(f"Requeuing job {job_id} after its worker stopped")
+                    await self.enqueue(job_id)
+
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+
+class JobService:
+    """
+    Run task splits in a bounded pool of background workers inside the app.
+    """
+
+    def __init__(
+        self,
+        task_service: TaskService,
+        store,
+        workers: int = 2,
+        lease: float = 60.0,
+    ):
+        self.task_service = task_service
+        self.store = store
+        self.workers = workers
+        self.lease = lease  # Seconds without a heartbeat before a running job is retried
+        self._tasks = []
+
+    async def start(self) -> None:
+        """
+        Start the background workers.
+        """
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._recover_periodically()))
+
+    async def stop(self) -> None:
+        """
+        Stop the background workers. Jobs stored in Redis are resumed by another worker.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit_split(self, user_id, task_id, num_subtasks: int) -> dict:
+        """
+        Queue a split of the given task and return its job. A split already
+        queued or running for the same task is returned instead of a new one.
+        """
+        job_id = str(uuid.uuid4())
+        dedupe_key = f"split:{task_id}"
+
+        existing_id = await self.store.claim(dedupe_key, job_id)
+        if existing_id:
+            existing = await self.store.load(existing_id)
+            if existing:
+                return existing
+
+        if await self.store.queue_length() >= self.store.max_queue:
+            await self.store.release(dedupe_key, job_id)
+            raise ServiceUnavailable("Too many pending jobs, please try again later")
+
+        job = {
+            "id": job_id,
+            "type": "split",
+            "status": "queued",
+            "user_id": str(user_id),
+            "task_id": str(task_id),
+            "count": num_subtasks,
+            "created_at": time.time(),
+            "heartbeat_at": time.time(),  # The lease starts when the job is queued
+            "finished_at": None,
+            "subtasks": [],
+            "error": None,
+        }
+        await self.store.save(job)
+        await self.store.enqueue(job_id)
+        return job
+
+    async def get_job(self, job_id: str, user_id) -> Optional[dict]:
+        """
+        Fetch a job, only if it belongs to the given user.
+        """
+        job = await self.store.load(job_id)
+        if not job or job["user_id"] != str(user_id):
+            return None
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self.store.dequeue(timeout=self.lease / 3)
+            if job_id is None:
+                continue
+
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                # Not acked: the job is requeued once its lease expires
+                raise
+            except Exception as e:
+                logger.exception(f"Job {job_id} crashed: {e}")
+            await self.store.ack(job_id)
+
+    async def _recover_periodically(self) -> None:
+        while True:
+            try:
+                await self.store.recover(self.lease)
+            except Exception as e:
+                logger.warning(f"Job recovery failed: {e}")
+            await asyncio.sleep(self.lease / 2)
+
+    async def _heartbeat(self, job: dict) -> None:
+        """
+        Renew the job's lease while it runs.
+        """
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            job["heartbeat_at"] = time.time()
+            await self.store.save(job)
+
+    async def _run(self, job_id: str) -> None:
+        job = await self.store.load(job_id)
+        if not job or job["status"] in ("succeeded", "failed"):
+            return
+
+        job["status"] = "running"
+        job["heartbeat_at"] = time.time()
+        await self.store.save(job)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            task = await self.task_service.get_task_by_id(
+                job["task_id"], job["user_id"]
+            )
+            if not task:
+                raise ValueError("Task not found")
+
+            subtasks = await self.task_service.split_task(
+                parent_task=task, num_subtasks=job["count"]
+            )
+            job["subtasks"] = serialize_tasks(subtasks)
+            job["status"] = "succeeded"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            heartbeat.cancel()
+
+        job["finished_at"] = time.time()
+        await self.store.save(job)
+        await self.store.release(f"split:{job['task_id']}", job_id)
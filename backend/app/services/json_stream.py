@@ -0,0 +1,67 @@
+# services/json_stream.py
+
+import json
+from typing import List
+
+
+class JSONArrayStream:
+    """
+    Incrementally extract the objects of a JSON array that arrives in chunks,
+    such as an LLM completion being streamed. Anything before the opening '['
+    or after the closing ']' (code block markers, prose) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""  # Everything fed so far
+        self.done = False  # The closing ']' has been seen
+        self._started = False
+        self._current: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        """
+        Consume a chunk of text and return the objects completed by it.
+        """
+        self.text += chunk
+        completed = []
+
+        for char in chunk:
+            if self.done:
+                break
+
+            # Wait for the array to open
+            if not self._started:
+                self._started = char == "["
+                continue
+
+            # Between objects: only the start of the next one or the end matter
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._current = [char]
+                elif char == "]":
+                    self.done = True
+                continue
+
+            self._current.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(json.loads("".join(self._current)))
+                    self._current = []
+
+        return completed
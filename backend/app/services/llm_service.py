@@ -1,12 +1,127 @@
+import asyncio
+import functools
+import hashlib
+import time
+from typing import AsyncIterator, Dict, Optional
 from connections.mistral import MistralConnection  # Updated import to Mistral
+from services.cache_service import CacheService
 
 
 class LLMService:
-    def __init__(self, mistral_conn: MistralConnection):
+    def __init__(
+        self, mistral_conn: MistralConnection, cache: Optional[CacheService] = None
+    ):
+        """
+        Initialize the LLMService with the Mistral connection and an optional
+        cache of responses keyed by prompt.
+        """
         self.mistral_conn = mistral_conn
+        self.cache = cache
+
+        # Upstream calls currently running, by cache key, so identical prompts share one
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "upstream_calls": 0,
+            "upstream_seconds": 0.0,
+        }
 
     async def ask_mistral(self, prompt: str) -> str:
         """
         Call Mistral API with the provided prompt and return the response as a string.
+        Responses are cached by a hash of the model and the normalized prompt.
+        """
+        key = self.cache_key(prompt)
+
+        if self.cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return cached
+
+        # Join an identical request already on its way to Mistral, or start one.
+        # The call runs in its own task and is shielded from its callers, so a
+        # caller that goes away does not cancel it for the others.
+        if key in self._in_flight:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.create_task(self._fetch(key, prompt))
+            task.add_done_callback(functools.partial(self._forget, key))
+            self._in_flight[key] = task
+        return await asyncio.shield(self._in_flight[key])
+
+    async def _fetch(self, key: str, prompt: str) -> str:
+        """
+        Call Mistral once for all the callers of a prompt and cache the response.
+        """
+        started = time.monotonic()
+        response = await self.mistral_conn.ask_mistral(prompt)
+        self.stats["upstream_calls"] += 1
+        self.stats["upstream_seconds"] += time.monotonic() - started
+
+        if self.cache:
+            await self.cache.set(key, response)
+        return response
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        del self._in_flight[key]
+        # Every caller may have gone; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def stream_mistral(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream the response to a prompt from Mistral as text chunks. A cached
+        response is replayed as a single chunk; a complete streamed response is
+        cached, with its code block markers stripped, for later calls.
+        """
+        key = self.cache_key(prompt)
+
+        if self.cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                yield cached
+                return
+
+        self.stats["misses"] += 1
+        started = time.monotonic()
+        chunks = []
+        async for chunk in self.mistral_conn.stream_mistral(prompt):
+            chunks.append(chunk)
+            yield chunk
+
+        self.stats["upstream_calls"] += 1
+        self.stats["upstream_seconds"] += time.monotonic() - started
+        if self.cache:
+            response = self.mistral_conn._strip_code_block_markers("".join(chunks))
+            await self.cache.set(key, response)
+
+    def cache_key(self, prompt: str) -> str:
+        """
+        Hash the model name and the prompt with whitespace normalized.
+        """
+        normalized = " ".join(prompt.split())
+        digest = hashlib.sha256(
+            f"{self.mistral_conn.model}\n{normalized}".encode("utf-8")
+        ).hexdigest()
+        return f"response:{digest}"
+
+    def cache_report(self) -> dict:
+        """
+        Summarize how much upstream work the cache saved.
         """
-        return await self.mistral_conn.ask_mistral(prompt)
+        answered = self.stats["hits"] + self.stats["coalesced"] + self.stats["misses"]
+        saved = self.stats["hits"] + self.stats["coalesced"]
+        average_latency = self.stats["upstream_seconds"] / max(
+            self.stats["upstream_calls"], 1
+        )
+        return {
+            **self.stats,
+            "hit_rate": saved / answered if answered else 0.0,
+            "estimated_seconds_saved": saved * average_latency,
+        }
@@ -0,0 +1,291 @@
+# services/metrics.py
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import weakref
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from sanic.log import logger
+from connections.database import query_operation
+
+# Label pairs of one series, in a fixed order
+Labels = Tuple[Tuple[str, str], ...]
+
+# Upper bounds, in seconds, shared by every latency histogram
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Every metric exported, with its Prometheus type and help text
+METRICS = {
+    "http_requests_total": (
+        "counter",
+        "HTTP requests answered, by method, route and status.",
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Time until the response headers were sent, by method and route.",
+    ),
+    "http_requests_in_progress": ("gauge", "HTTP requests being handled."),
+    "db_queries_total": ("counter", "SQL statements sent, by operation."),
+    "db_query_errors_total": ("counter", "SQL statements that failed, by operation."),
+    "db_query_duration_seconds": (
+        "histogram",
+        "Time spent on SQL statements, by operation.",
+    ),
+    "llm_requests_total": (
+        "counter",
+        "MistralConnection.ask_mistral calls, by status (ok, error, unavailable).",
+    ),
+    "llm_request_duration_seconds": (
+        "histogram",
+        "Duration of MistralConnection.ask_mistral calls, retries included.",
+    ),
+    "llm_cache_requests_total": (
+        "counter",
+        "LLM prompts answered from the cache (hits), by an identical call in "
+        "flight (coalesced) or upstream (misses).",
+    ),
+    "split_prompts_total": (
+        "counter",
+        "Split prompts answered, by how existing subtasks were listed (full, "
+        "titles or summary).",
+    ),
+    "split_prompt_tokens_total": (
+        "counter",
+        "Estimated tokens of the split prompts answered, by listing mode.",
+    ),
+    "split_prompt_seconds_total": (
+        "counter",
+        "Time spent waiting for answers to split prompts, by listing mode.",
+    ),
+    "cache_events_total": ("counter", "Cache lookups and invalidations, by cache."),
+    "metrics_workers": ("gauge", "Server workers whose metrics are included."),
+}
+
+
+def default_directory() -> str:
+    """
+    A directory shared by the workers of one server: they are all children of
+    the same main process.
+    """
+    return os.path.join(tempfile.gettempdir(), f"todo-api-metrics-{os.getppid()}")
+
+
+class Metrics:
+    """
+    Counters, gauges and latency histograms of one server worker. Only the
+    worker's event loop updates them, so plain dicts do without locks. Each
+    worker writes a snapshot to a directory shared with the other workers
+    every flush_interval seconds, and render() adds them all up.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.path = os.path.join(directory, f"{os.getpid()}.json")
+
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # Per series: one count per bucket, one for +Inf, then the sum
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+        # Requests being handled; a request dropped without a response is
+        # garbage collected, and no longer counted, instead of leaking
+        self.in_flight = weakref.WeakSet()
+
+        # Counters kept by the services themselves, read when taking a snapshot
+        self._stats: List[tuple] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, seconds: float) -> None:
+        key = (name, labels)
+        series = self.histograms.get(key)
+        if series is None:
+            series = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        series[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series[-1] += seconds
+
+    def observe_query(self, query: str, seconds: float, failed: bool) -> None:
+        """
+        Record one SQL statement, as reported by connections.database.
+        """
+        labels = (("operation", query_operation(query)),)
+        self.inc("db_queries_total", labels)
+        self.observe("db_query_duration_seconds", labels, seconds)
+        if failed:
+            self.inc("db_query_errors_total", labels)
+
+    def add_stats(
+        self,
+        name: str,
+        stats: dict,
+        label: str,
+        keys: Optional[Iterable[str]] = None,
+        **labels: str,
+    ) -> None:
+        """
+        Export a service's stats dict as the counter 'name', one series per key
+        (all keys by default) told apart by 'label'.
+        """
+        base = tuple(labels.items())
+        self._stats.append((name, stats, label, keys, base))
+
+    def snapshot(self) -> dict:
+        counters = dict(self.counters)
+        for name, stats, label, keys, base in self._stats:
+            for key in stats if keys is None else keys:
+                counters[(name, base + ((label, key),))] = stats[key]
+
+        return {
+            "counters": [
+                [name, labels, value] for (name, labels), value in counters.items()
+            ],
+            "gauges": [["http_requests_in_progress", (), len(self.in_flight)]],
+            "histograms": [
+                [name, labels, series]
+                for (name, labels), series in self.histograms.items()
+            ],
+        }
+
+    def flush(self) -> None:
+        """
+        Write this worker's snapshot, replacing the previous one at once.
+        """
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, self.path)
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush()
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        try:
+            os.remove(self.path)
+            os.rmdir(self.directory)  # Only once the last worker has stopped
+        except OSError:
+            pass
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def _worker_snapshots(self) -> List[dict]:
+        """
+        This worker's snapshot and the latest one of every live worker. Files
+        left by workers that stopped flushing are ignored, then removed.
+        """
+        snapshots = [self.snapshot()]
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if path == self.path or not filename.endswith(".json"):
+                continue
+            try:
+                age = now - os.path.getmtime(path)
+                if age > 10 * self.flush_interval:
+                    os.remove(path)
+                    continue
+                if age > 3 * self.flush_interval:
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Removed or being replaced by its worker
+        return snapshots
+
+    def render(self) -> str:
+        """
+        All workers' metrics in the Prometheus text exposition format.
+        """
+        snapshots = self._worker_snapshots()
+
+        series: Dict[str, Dict[Labels, object]] = {name: {} for name in METRICS}
+        for snapshot in snapshots:
+            for kind in ("counters", "gauges"):
+                for name, labels, value in snapshot[kind]:
+                    values = series[name]
+                    labels = tuple(tuple(pair) for pair in labels)
+                    values[labels] = values.get(labels, 0) + value
+            for name, labels, counts in snapshot["histograms"]:
+                values = series[name]
+                labels = tuple(tuple(pair) for pair in labels)
+                total = values.get(labels)
+                if total is None:
+                    values[labels] = list(counts)
+                else:
+                    for i, count in enumerate(counts):
+                        total[i] += count
+        series["metrics_workers"][()] = len(snapshots)
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series[name].items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format(value)}")
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), value):
+                    cumulative += count
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_sum{_format_labels(labels)} {_format(value[-1])}"
+                )
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,65 @@
+# services/password_hasher.py
+
+import asyncio
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from sanic.exceptions import ServiceUnavailable
+
+
+class PasswordHasher:
+    """
+    Run bcrypt in a bounded thread pool so hashing never blocks the event loop.
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 2, max_pending: int = 32):
+        self.rounds = rounds
+        self.max_pending = max_pending  # Running and queued hashes per worker
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+        self._pending = 0
+
+    async def _run(self, func, *args):
+        """
+        Run a bcrypt call in the pool, or fail fast when too many are waiting.
+        """
+        if self._pending >= self.max_pending:
+            raise ServiceUnavailable("Server is busy, please try again later")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured cost factor.
+        """
+        hashed = await self._run(
+            bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(self.rounds)
+        )
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """
+        Check a password against a stored bcrypt hash.
+        """
+        return await self._run(
+            bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8")
+        )
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """
+        Tell whether a hash was made with a different cost factor than the configured one.
+        Hashes look like $2b$12$..., where 12 is the cost.
+        """
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
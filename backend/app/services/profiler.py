@@ -0,0 +1,117 @@
+# services/profiler.py
+
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Stands for the stacks of the worker's other tasks, sampled while they ran
+OTHER_TASKS = "(other tasks)"
+
+
+def sign_profile_request(
+    secret: str, method: str, path: str, timestamp: Optional[int] = None
+) -> str:
+    """
+    The X-Profile header value asking to profile one request: a timestamp and
+    an HMAC-SHA256 of it with the method and path, keyed with PROFILE_SECRET.
+    'path' includes the query string, if any, after a "?".
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    message = f"{timestamp}:{method.upper()}:{path}".encode()
+    signature = hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+    return f"{timestamp}:{signature}"
+
+
+def verify_profile_request(
+    header: str, secret: str, method: str, path: str, max_age: float
+) -> bool:
+    """
+    Check an X-Profile header signed for this method and path, no more than
+    max_age seconds ago. Until then the header can be sent again, any number
+    of times: it is not bound to a single request.
+    """
+    timestamp, _, signature = header.partition(":")
+    try:
+        issued = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - issued) > max_age:
+        return False
+
+    expected = sign_profile_request(secret, method, path, issued)
+    return hmac.compare_digest(header.encode(), expected.encode())
+
+
+class SamplingProfiler:
+    """
+    Sample the call stack of one thread from a helper thread, every 'interval'
+    seconds, and count identical stacks. The profiled thread runs untouched.
+    Given the asyncio task of a request, samples taken while another task of
+    the event loop runs are counted as OTHER_TASKS, without their stacks.
+    Samples of an event loop waiting in select() are time the worker spent
+    awaiting I/O, the database, Redis or the LLM, for any of its requests.
+    """
+
+    def __init__(
+        self,
+        thread_id: int,
+        interval: float = 0.001,
+        max_seconds: float = 30.0,
+        task: Optional[asyncio.Task] = None,
+    ):
+        self.thread_id = thread_id
+        self.task = task
+        self.interval = interval
+        self.max_seconds = max_seconds  # In case the request is never answered
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        """
+        Whether samples are still being taken: stop() has not been called and
+        max_seconds have not passed.
+        """
+        return self._thread.is_alive()
+
+    def _sample(self) -> None:
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stopped.wait(self.interval) and time.monotonic() < deadline:
+            if self.task is not None:
+                running = asyncio.current_task(self.task.get_loop())
+                if running is not None and running is not self.task:
+                    self.stacks[OTHER_TASKS] += 1
+                    continue
+
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} "
+                    f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """
+        The samples as folded stacks, one "caller;callee count" line per stack,
+        as read by flamegraph.pl, speedscope or inferno.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
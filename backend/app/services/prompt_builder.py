@@ -0,0 +1,195 @@
+# services/prompt_builder.py
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sanic.log import logger
+
+# Rough average for English text with Mistral's tokenizers, no tokenizer needed
+CHARS_PER_TOKEN = 4
+
+# Ways of listing the existing subtasks, from the most to the least detailed
+PROMPT_MODES = ("full", "titles", "summary")
+
+PARENT_DESCRIPTION_CHARS = 2000
+SUMMARY_KEYWORDS = 10
+SUMMARY_WORD = re.compile(r"[^\W\d_]{4,}")
+SUMMARY_STOPWORDS = frozenset(
+    "about after also before from have into more over that their them then "
+    "there these they this those through under until when where which while "
+    "will with your".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def shorten(text: Optional[str], max_chars: int) -> str:
+    """
+    Collapse the whitespace of a text and cut it to max_chars, marking the cut.
+    """
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 1].rstrip() + "…"
+
+
+class SplitPrompt:
+    """
+    A split prompt, with how its existing subtasks were listed.
+    """
+
+    def __init__(self, text: str, mode: str, existing: int, listed: int):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.mode = mode  # One of PROMPT_MODES
+        self.existing = existing  # Existing subtasks, duplicates included
+        self.listed = listed  # Existing subtasks named in the prompt
+
+
+class SplitPromptBuilder:
+    """
+    Build the prompt asking the LLM to split a task within max_tokens, however
+    many subtasks the task already has. Existing subtasks are deduplicated by
+    title and listed with their descriptions cut to description_chars, then
+    by title only if that is too long, then as a summary: their number, the
+    most recent titles that fit and their most frequent words.
+    """
+
+    def __init__(self, max_tokens: int = 4000, description_chars: int = 200):
+        self.max_tokens = max_tokens
+        self.description_chars = description_chars
+
+        # Per mode: prompts built, their estimated tokens and LLM seconds
+        self.calls = dict.fromkeys(PROMPT_MODES, 0)
+        self.tokens = dict.fromkeys(PROMPT_MODES, 0)
+        self.seconds = dict.fromkeys(PROMPT_MODES, 0.0)
+
+    def frame(
+        self, title: str, description: Optional[str], num_subtasks: int
+    ) -> Tuple[str, str, int]:
+        """
+        The text before and after the existing subtasks, and how many tokens
+        are left for them.
+        """
+        head = (
+            f"Split the following task into a maximum of {num_subtasks} "
+            "additional subtasks, while considering the existing subtasks. "
+            "Do not alter or repeat existing subtasks.\n"
+            f"Title: {title}\n"
+            f"Description: {shorten(description, PARENT_DESCRIPTION_CHARS)}\n"
+            "Existing subtasks:\n"
+        )
+        tail = (
+            "The response should be a JSON array of new subtasks, where each "
+            "object has the following format:\n"
+            "[\n"
+            "  {\n"
+            '    "title": "Subtask Title",\n'
+            '    "description": "Subtask Description"\n'
+            "  },\n"
+            "  ...\n"
+            "]\n"
+            "Make sure the titles and descriptions are clear and concise."
+        )
+        allowance = self.max_tokens - estimate_tokens(head + tail)
+        return head, tail, allowance
+
+    def list_existing(
+        self, subtasks: List[Tuple[str, Optional[str]]], allowance: int
+    ) -> dict:
+        """
+        List (title, description) pairs, oldest first, in at most 'allowance'
+        tokens. Returns the text with its mode and counts, as a JSON-ready dict.
+        """
+        unique: Dict[str, Tuple[str, str]] = {}
+        for title, description in subtasks:
+            title = " ".join((title or "").split())
+            key = title.casefold()
+            if title and key not in unique:
+                unique[key] = (title, shorten(description, self.description_chars))
+        unique_subtasks = list(unique.values())
+
+        text = "".join(
+            f"- {title}: {description}\n" if description else f"- {title}\n"
+            for title, description in unique_subtasks
+        )
+        mode = "full"
+        if estimate_tokens(text) > allowance:
+            text = "".join(f"- {title}\n" for title, _ in unique_subtasks)
+            mode = "titles"
+        listed = len(unique_subtasks)
+        if estimate_tokens(text) > allowance:
+            text, listed = self._summarize(unique_subtasks, len(subtasks), allowance)
+            mode = "summary"
+        return {
+            "text": text,
+            "mode": mode,
+            "existing": len(subtasks),
+            "listed": listed,
+        }
+
+    def build(
+        self,
+        title: str,
+        description: Optional[str],
+        num_subtasks: int,
+        existing: dict,
+    ) -> SplitPrompt:
+        """
+        Put the prompt together around a listing made by list_existing.
+        """
+        head, tail, _ = self.frame(title, description, num_subtasks)
+        return SplitPrompt(
+            head + existing["text"] + tail,
+            existing["mode"],
+            existing["existing"],
+            existing["listed"],
+        )
+
+    def record(self, prompt: SplitPrompt, seconds: float) -> None:
+        """
+        Account for a prompt answered by the LLM after 'seconds', cache hits
+        included, and log it so that max_tokens can be tuned.
+        """
+        self.calls[prompt.mode] += 1
+        self.tokens[prompt.mode] += prompt.tokens
+        self.seconds[prompt.mode] += seconds
+        logger.info(
+            f"split_prompt mode={prompt.mode} prompt_tokens={prompt.tokens} "
+            f"budget={self.max_tokens} existing={prompt.existing} "
+            f"listed={prompt.listed} latency_ms={seconds * 1000:.0f}"
+        )
+
+    @staticmethod
+    def _summarize(
+        subtasks: List[Tuple[str, str]], count: int, allowance: int
+    ) -> Tuple[str, int]:
+        """
+        Sum up subtasks in 'allowance' tokens: their number, the most recent
+        titles that fit and the most frequent words of them all.
+        """
+        words = Counter(
+            word
+            for title, description in subtasks
+            for word in SUMMARY_WORD.findall(f"{title} {description}".casefold())
+            if word not in SUMMARY_STOPWORDS
+        )
+        keywords = ", ".join(word for word, _ in words.most_common(SUMMARY_KEYWORDS))
+        first = f"{count} subtasks exist, the most recent ones are:\n"
+        last = f"- ...and others about: {keywords}\n"
+
+        titles = []
+        remaining = allowance - estimate_tokens(first + last)
+        for title, _ in reversed(subtasks):
+            line = f"- {title}\n"
+            remaining -= estimate_tokens(line)
+            if remaining < 0:
+                break
+            titles.append(line)
+
+        if len(titles) == len(subtasks):
+            last = ""
+        return first + "".join(titles) + last, len(titles)
@@ -1,101 +1,483 @@
-from models.Task import Task
-from models.User import User
+from models.Task import (
+    Task,
+    ROOT_TASK_ID,
+    MAX_TASK_DEPTH,
+    PATH_SEGMENT_LENGTH,
+    path_segment,
+    search_rowid_range,
+)
 from services.llm_service import LLMService
+from services.cache_service import CacheService
+from services.json_stream import JSONArrayStream
+from services.prompt_builder import SplitPrompt, SplitPromptBuilder
 from tortoise.exceptions import DoesNotExist
+from tortoise.expressions import F, Q
+from tortoise.functions import Count, Length, Max
+from tortoise import connections, timezone
+from tortoise.transactions import in_transaction
+from config import Config
+import asyncio
+import base64
 import json
-from typing import List
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+# A task and its descendants, parents before children, down to a maximum depth.
+# The depth bound also stops the recursion should the hierarchy contain a cycle.
+SUBTREE_SQL = """
+WITH RECURSIVE subtree (id, depth) AS (
+    SELECT id, 0 FROM tasks WHERE id = {p} AND user_id = {p}
+    UNION ALL
+    SELECT child.id, subtree.depth + 1
+    FROM tasks AS child
+    JOIN subtree ON child.parent_task_id = subtree.id
+    WHERE child.user_id = {p} AND subtree.depth < {p}
+)
+SELECT tasks.id, tasks.title, tasks.description, tasks.status, tasks.created_at,
+       tasks.user_id, tasks.parent_task_id, tasks.subtask_count, tasks.path,
+       subtree.depth
+FROM subtree
+JOIN tasks ON tasks.id = subtree.id
+ORDER BY subtree.depth, tasks.created_at, tasks.id
+"""
+
+# The most recent tasks of a user matching a full-text query, every term required.
+# On SQLite the rowid range confines the index lookup to the user's bucket.
+SEARCH_SQL = {
+    "sqlite": """
+SELECT tasks.id, tasks.title, tasks.description, tasks.status, tasks.created_at,
+       tasks.user_id, tasks.parent_task_id, tasks.subtask_count, tasks.path
+FROM tasks_fts
+JOIN tasks ON tasks.rowid = tasks_fts.rowid - ?
+WHERE tasks_fts MATCH ? AND tasks_fts.rowid BETWEEN ? AND ?
+  AND tasks.user_id = ? AND tasks.id <> ?
+ORDER BY tasks_fts.rowid DESC
+LIMIT ?
+""",
+    "mysql": """
+SELECT id, title, description, status, created_at, user_id, parent_task_id,
+       subtask_count, path
+FROM tasks
+WHERE MATCH (title, description) AGAINST (%s IN BOOLEAN MODE)
+  AND user_id = %s AND id <> %s
+ORDER BY created_at DESC
+LIMIT %s
+""",
+}
+SEARCH_WORD = re.compile(r"\w+")
+MAX_SEARCH_TERMS = 8
+MAX_SEARCH_CANDIDATES = 5000  # Matches ranked per query, the most recent ones
+SEARCH_TITLE_WEIGHT = 2.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TITLE_MAX_LENGTH = Task._meta.fields_map["title"].max_length
 
 
 class TaskService:
-    def __init__(self, llm_service: LLMService):
+    def __init__(
+        self,
+        llm_service: LLMService,
+        cache: Optional[CacheService] = None,
+        prompt_builder: Optional[SplitPromptBuilder] = None,
+    ):
         """
-        Initialize the TaskService with the LLMService dependency.
+        Initialize the TaskService with the LLMService dependency, an optional
+        cache for task reads and the builder of split prompts.
         """
         self.llm_service = llm_service  # Fixed the trailing dot
+        self.cache = cache
+        self.prompt_builder = prompt_builder or SplitPromptBuilder()
 
-    async def get_task_by_id(self, task_id: str, user) -> Task:
+    async def get_task_by_id(self, task_id: str, user_id) -> Task:
         """
         Fetch a task by its ID for the given user.
         """
         try:
-            task = await Task.get(id=task_id, user=user)
-            return task
+            task_id = UUID(str(task_id))  # As spelled in the tags of the task
+        except ValueError:
+            return None
+
+        cache_key = f"task:{user_id}:{task_id}"
+        tags = [f"task:{task_id}"]
+        if self.cache:
+            row = await self.cache.get(cache_key)
+            if row is not None:
+                return self._task_from_row(row)
+            # A write landing during the read below keeps the row out of the cache
+            since = await self.cache.generations(tags)
+
+        try:
+            task = await Task.get(id=task_id, user_id=user_id)
         except DoesNotExist:
             return None  # Task not found
 
-    async def update_task(self, task: Task, updated_fields: dict) -> Task:
+        if self.cache:
+            await self.cache.set(
+                cache_key, self._task_to_row(task), tags=tags, since=since
+            )
+        return task
+
+    async def get_etag(self, user_id, task_id=None) -> Optional[str]:
+        """
+        Return the ETag of the user's project listing or, given a task, of the
+        task and its subtask pages, without loading any of them.
+        Returns None when there is no validator to offer: no cache is configured,
+        or the last write is so recent that a worker may still serve older rows.
         """
-        Update a task with the provided fields and save it to the database.
+        if not self.cache:
+            return None
+
+        key = f"task:{user_id}:{task_id}" if task_id else f"user:{user_id}"
+        version = await self.cache.get_version(key)
+        if version is None or not self.cache.is_settled(version):
+            return None
+        return f'W/"{version:x}"'
+
+    async def update_task(
+        self, task_id: str, user_id, updated_fields: dict
+    ) -> Optional[Task]:
         """
-        for field, value in updated_fields.items():
-            setattr(task, field, value)
+        Update a task of the given user with the provided fields and save it to
+        the database, or return None if there is no such task. The row is read
+        and locked in the transaction, never taken from the cache.
+        A reparented task takes its whole subtree along; moving a task under
+        itself or one of its own subtasks raises a ValueError.
+        """
+        async with in_transaction() as conn:
+            task = (
+                await Task.filter(id=task_id, user_id=user_id)
+                .using_db(conn)
+                .select_for_update()
+                .first()
+            )
+            if not task:
+                return None
+            old_parent_id = task.parent_task_id
+
+            # Write back only the edited columns, not counters or paths changed since
+            update_fields = []
+            for field, value in updated_fields.items():
+                setattr(task, field, value)
+                update_fields.append(
+                    "parent_task_id" if field == "parent_task" else field
+                )
 
-        await task.save()  # Save the updated task to the database
+            if task.parent_task_id != old_parent_id:
+                task.path = await self._move_subtree(task, conn)
+                update_fields.append("path")
+
+            if update_fields:
+                await task.save(update_fields=update_fields, using_db=conn)
+
+            # Move the subtask count along with the task when it is reparented
+            if task.parent_task_id != old_parent_id:
+                await self._adjust_subtask_count(old_parent_id, -1, conn)
+                await self._adjust_subtask_count(task.parent_task_id, 1, conn)
+
+        await self._invalidate(
+            task.user_id, task.id, old_parent_id, task.parent_task_id
+        )
         return task
 
     async def create_task(
         self,
         title: str,
         description: str,
-        user,
-        parent_task_id: str = "00000000-0000-0000-0000-000000000000",
+        user_id,
+        parent_task_id: str = ROOT_TASK_ID,
     ) -> Task:
         """
         Create a new task for the given user, optionally associating it with a parent task.
         """
-        # Create a new task, associating it with the parent task if provided
-        task = await Task.create(
-            title=title,
-            description=description,
-            user=user,
-            parent_task_id=parent_task_id,  # Associate with the parent task if provided
-        )
+        task_id = uuid4()
+        async with in_transaction() as conn:
+            parent_path = await self._get_path(parent_task_id, conn)
+
+            # Create a new task, associating it with the parent task if provided
+            task = await Task.create(
+                id=task_id,
+                title=title,
+                description=description,
+                user_id=user_id,
+                parent_task_id=parent_task_id,  # Associate with the parent task if provided
+                path=self._child_path(parent_path, task_id),
+                using_db=conn,
+            )
+            await self._adjust_subtask_count(parent_task_id, 1, conn)
+
+        await self._invalidate(task.user_id, parent_task_id)
         return task
 
-    async def delete_task(self, task_id: str, user) -> bool:
+    async def delete_task(self, task_id: str, user_id) -> bool:
         """
-        Delete a task by its ID for the given user.
+        Delete a task by its ID for the given user, along with all its subtasks.
         """
-        task = await Task.filter(id=task_id, user=user).first()
+        async with in_transaction() as conn:
+            task = (
+                await Task.filter(id=task_id, user_id=user_id)
+                .using_db(conn)
+                .select_for_update()
+                .first()
+            )
+            if task:
+                subtree = Task.filter(
+                    user_id=user_id, **self._subtree_range(task.path)
+                ).using_db(conn)
+                deleted_ids = await subtree.values_list("id", flat=True)
+                await subtree.delete()
+                await self._adjust_subtask_count(task.parent_task_id, -1, conn)
+
         if task:
-            await task.delete()
+            await self._invalidate(task.user_id, task.parent_task_id, *deleted_ids)
             return True
         return False
 
-    async def get_all_projects(self, user) -> list:
+    async def get_ancestors(self, task_id, user_id) -> List[Task]:
         """
-        Fetch all projects for the given user.
-        If a parent_id is provided, fetch only tasks that have the given parent_id (subtasks).
-        If no parent_id is provided, fetch tasks with no parent (top-level tasks).
+        Fetch the ancestors of a task of the given user, from its project down to
+        its parent, with two indexed queries whatever the depth.
         """
+        path = (
+            await Task.filter(id=task_id, user_id=user_id)
+            .first()
+            .values_list("path", flat=True)
+        )
+        if not path:
+            return []
+
+        ancestor_ids = [UUID(segment) for segment in path.split("/")[:-2]]
+        ancestors = await Task.filter(id__in=ancestor_ids, user_id=user_id)
+        return sorted(ancestors, key=lambda ancestor: len(ancestor.path))
+
+    async def get_all_projects(self, user_id) -> list:
+        """
+        Fetch all projects (top-level tasks) for the given user.
+        Each returned task carries its number of direct subtasks in `subtask_count`.
+        """
+        cache_key = f"projects:{user_id}"
+        tags = [f"user:{user_id}"]
+        if self.cache:
+            rows = await self.cache.get(cache_key)
+            if rows is not None:
+                return [self._task_from_row(row) for row in rows]
+            since = await self.cache.generations(tags)
 
-        # TODO: That's a magic constant that should be defined.
         # Fetch top-level tasks with no parent
-        tasks = await Task.filter(
-            user=user, parent_task_id="00000000-0000-0000-0000-000000000000"
-        ).all()
+        query = Task.filter(user_id=user_id, parent_task_id=ROOT_TASK_ID)
+
+        if Config.USE_SUBTASK_COUNT_COLUMN:
+            # The denormalized counter is maintained by every write, so read it as is
+            tasks = await query.all()
+        else:
+            # Otherwise count the subtasks of every project in one grouped query
+            tasks = (
+                await query.annotate(counted_subtasks=Count("subtasks"))
+                .group_by("id")
+                .all()
+            )
+            for task in tasks:
+                task.subtask_count = task.counted_subtasks
 
+        if self.cache:
+            await self.cache.set(
+                cache_key,
+                [self._task_to_row(task) for task in tasks],
+                tags=tags,
+                since=since,
+            )
         return tasks
 
     async def get_subtasks(
-        self, user, parent_task, page: int = 1, page_size: int = 10
+        self, user_id, parent_task, page: int = 1, page_size: int = 10
     ) -> List[Task]:
         """
-        Fetch all subtasks for a task, with pagination.
+        Fetch all subtasks for a task, with offset pagination.
+        Kept for compatibility, prefer get_subtasks_after for deep pages.
         """
+        cache_key = (
+            f"subtasks:{user_id}:{parent_task.id}:{page}:{page_size}"
+        )
+        tags = [f"children:{parent_task.id}"]
+        if self.cache:
+            rows = await self.cache.get(cache_key)
+            if rows is not None:
+                return [self._task_from_row(row) for row in rows]
+            since = await self.cache.generations(tags)
+
         # Calculate the offset based on the page and page size
         offset = (page - 1) * page_size
 
         # Fetch the subtasks with pagination
         tasks = (
-            await Task.filter(user=user, parent_task=parent_task)
+            await Task.filter(user_id=user_id, parent_task=parent_task)
+            .order_by("created_at", "id")
             .limit(page_size)
             .offset(offset)
             .all()
         )
 
+        if self.cache:
+            await self.cache.set(
+                cache_key,
+                [self._task_to_row(task) for task in tasks],
+                tags=tags,
+                since=since,
+            )
         return tasks
 
+    async def get_subtasks_after(
+        self, user_id, parent_task, cursor: Optional[str] = None, page_size: int = 10
+    ) -> Tuple[List[Task], Optional[str]]:
+        """
+        Fetch a page of subtasks ordered by (created_at, id), starting after the
+        given cursor. Returns the subtasks and the cursor of the next page, if any.
+        """
+        cache_key = (
+            f"subtasks:{user_id}:{parent_task.id}"
+            f":after:{cursor or ''}:{page_size}"
+        )
+        tags = [f"children:{parent_task.id}"]
+        if self.cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                rows, next_cursor = cached
+                return [self._task_from_row(row) for row in rows], next_cursor
+            since = await self.cache.generations(tags)
+
+        query = Task.filter(user_id=user_id, parent_task=parent_task)
+        if cursor:
+            created_at, last_id = self._decode_cursor(cursor)
+            query = query.filter(
+                Q(created_at__gt=created_at)
+                | Q(created_at=created_at, id__gt=last_id)
+            )
+
+        # Fetch one extra row to know whether there is a next page
+        tasks = await query.order_by("created_at", "id").limit(page_size + 1).all()
+
+        next_cursor = None
+        if len(tasks) > page_size:
+            tasks = tasks[:page_size]
+            next_cursor = self._encode_cursor(tasks[-1])
+
+        if self.cache:
+            await self.cache.set(
+                cache_key,
+                [[self._task_to_row(task) for task in tasks], next_cursor],
+                tags=tags,
+                since=since,
+            )
+        return tasks, next_cursor
+
+    async def get_task_tree(self, task_id, user_id, max_depth: int) -> List[Task]:
+        """
+        Fetch a task of the given user and all its descendants down to 'max_depth'
+        levels below it, with one recursive query. The task comes first, and every
+        task comes after its parent. Returns an empty list if the task is not found.
+        """
+        conn = connections.get("default")
+        placeholder = "%s" if conn.capabilities.dialect == "mysql" else "?"
+
+        _, rows = await conn.execute_query(
+            SUBTREE_SQL.format(p=placeholder),
+            [str(task_id), str(user_id), str(user_id), max_depth],
+        )
+        return [Task._init_from_db(**row) for row in rows]
+
+    async def search_tasks(
+        self, user_id, text: str, cursor: Optional[str] = None, page_size: int = 10
+    ) -> Tuple[List[Tuple[Task, float]], Optional[str]]:
+        """
+        Find the tasks of the given user whose title or description contains
+        every word of 'text', through the full-text index, best matches first.
+        Only the MAX_SEARCH_CANDIDATES most recent matches are ranked.
+        Returns (task, score) pairs and the cursor of the next page, if any.
+        """
+        terms = list(dict.fromkeys(SEARCH_WORD.findall(text.lower())))
+        terms = terms[:MAX_SEARCH_TERMS]
+        if not terms:
+            raise ValueError("The search query must contain at least one word.")
+        after = self._decode_search_cursor(cursor) if cursor else None
+
+        conn = connections.get("default")
+        if conn.capabilities.dialect == "mysql":
+            query = " ".join(f"+{term}" for term in terms)
+            params = [query, str(user_id), ROOT_TASK_ID, MAX_SEARCH_CANDIDATES]
+        else:
+            # Quoting every term keeps user input out of the FTS5 query syntax
+            query = " AND ".join(f'"{term}"' for term in terms)
+            first, last = search_rowid_range(user_id)
+            params = [
+                first,
+                query,
+                first,
+                last,
+                str(user_id),
+                ROOT_TASK_ID,
+                MAX_SEARCH_CANDIDATES,
+            ]
+
+        _, rows = await conn.execute_query(
+            SEARCH_SQL[conn.capabilities.dialect], params
+        )
+
+        # Rank the raw rows, only the tasks of the page are built
+        scores = self._rank_matches(terms, rows)
+        ranked = sorted(
+            zip(scores, (str(row["id"]) for row in rows), rows),
+            key=lambda match: (-match[0], match[1]),
+        )
+        if after:
+            score, last_id = after
+            ranked = [
+                match
+                for match in ranked
+                if match[0] < score or (match[0] == score and match[1] > last_id)
+            ]
+
+        next_cursor = None
+        if len(ranked) > page_size:
+            ranked = ranked[:page_size]
+            next_cursor = self._encode_search_cursor(*ranked[-1][:2])
+
+        matches = [(Task._init_from_db(**row), score) for score, _, row in ranked]
+        return matches, next_cursor
+
+    @staticmethod
+    def _rank_matches(terms: List[str], rows: List[dict]) -> List[float]:
+        """
+        Score rows containing every term with BM25 over their title and
+        description, the title weighing more. Term rarity is left out: the
+        index only returns rows that contain all the terms.
+        """
+        fields = [
+            (
+                SEARCH_WORD.findall(row["title"].lower()),
+                SEARCH_WORD.findall((row["description"] or "").lower()),
+            )
+            for row in rows
+        ]
+        count = max(1, len(fields))
+        averages = [
+            max(1.0, sum(len(words[i]) for words in fields) / count) for i in (0, 1)
+        ]
+
+        scores = []
+        for words in fields:
+            score = 0.0
+            for i, weight in ((0, SEARCH_TITLE_WEIGHT), (1, 1.0)):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * len(words[i]) / averages[i])
+                for term in terms:
+                    frequency = words[i].count(term)
+                    score += weight * frequency * (BM25_K1 + 1) / (frequency + norm)
+            scores.append(round(score, 6))
+        return scores
+
     async def split_task(
         self,
         parent_task: Task,
@@ -110,79 +492,888 @@ class TaskService:
         if num_subtasks < 1:
             raise ValueError("The number of subtasks must be at least 1.")
 
-        # Fetch existing subtasks from the database
-        existing_subtasks = await Task.filter(parent_task=parent_task).all()
+        items = await self._generate_subtasks(parent_task, num_subtasks)
 
-        # If there are existing subtasks, we need to pass them to the LLM
-        existing_subtasks_data = [
-            {"title": subtask.title, "description": subtask.description}
-            for subtask in existing_subtasks
-        ]
+        # Create them all at once, for the owner of the parent task
+        return await self.bulk_create_tasks(parent_task.user_id, items)
 
-        # Fetch the title, description, and user from the parent task
-        title = parent_task.title
-        description = parent_task.description
-        user = await User.filter(uuid=parent_task.user_id).first()
+    async def get_splittable_subtasks(
+        self, parent_task: Task, limit: int
+    ) -> List[Task]:
+        """
+        Fetch the direct subtasks of a task that have no subtasks of their own,
+        oldest first, up to 'limit' of them.
+        """
+        query = Task.filter(user_id=parent_task.user_id, parent_task=parent_task)
 
-        # Create a prompt to send to LLM, passing the existing subtasks
-        prompt = (
-            f"Split the following task into a maximum of {num_subtasks} additional subtasks, "
-            "while considering the existing subtasks. Do not alter or repeat existing subtasks.\n"
-            f"Title: {title}\nDescription: {description}\n"
-            "Existing subtasks:\n"
-        )
+        if Config.USE_SUBTASK_COUNT_COLUMN:
+            query = query.filter(subtask_count=0)
+        else:
+            query = (
+                query.annotate(counted_subtasks=Count("subtasks"))
+                .group_by("id")
+                .filter(counted_subtasks=0)
+            )
+        return await query.order_by("created_at", "id").limit(limit)
 
-        for subtask in existing_subtasks_data:
-            prompt += f"- {subtask['title']}: {subtask['description']}\n"
+    async def split_all(
+        self, tasks: List[Task], num_subtasks: int = 2, concurrency: int = 4
+    ) -> AsyncIterator[Tuple[Task, List[Task], Optional[Exception]]]:
+        """
+        Split every given task like split_task, asking the LLM for up to
+        'concurrency' of them at a time. As answers arrive, all those ready are
+        written with a single bulk insert, then yielded one (task, subtasks, error)
+        tuple per task. A failed split carries its exception and no subtasks.
+        """
+        if num_subtasks < 1:
+            raise ValueError("The number of subtasks must be at least 1.")
+        if not tasks:
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+        answers = asyncio.Queue()
+
+        async def generate(task: Task) -> None:
+            async with semaphore:
+                try:
+                    # The tasks have no subtasks yet, no need to read them
+                    items = await self._generate_subtasks(task, num_subtasks, [])
+                except Exception as e:
+                    await answers.put((task, [], e))
+                else:
+                    await answers.put((task, items, None))
+
+        generators = [asyncio.create_task(generate(task)) for task in tasks]
+        try:
+            pending = len(generators)
+            while pending:
+                ready = [await answers.get()]
+                while not answers.empty():
+                    ready.append(answers.get_nowait())
+                pending -= len(ready)
 
-        prompt += (
-            "The response should be a JSON array of new subtasks, where each object has the following format:\n"
-            "[\n"
-            "  {\n"
-            '    "title": "Subtask Title",\n'
-            '    "description": "Subtask Description"\n'
-            "  },\n"
-            "  ...\n"
-            "]\n"
-            "Make sure the titles and descriptions are clear and concise."
+                created = await self.bulk_create_tasks(
+                    tasks[0].user_id, [item for _, items, _ in ready for item in items]
+                )
+                subtasks = defaultdict(list)
+                for subtask in created:
+                    subtasks[subtask.parent_task_id].append(subtask)
+
+                for task, _, error in ready:
+                    yield task, subtasks[task.id], error
+        finally:
+            # The client went away or the write failed: stop asking the LLM
+            for generator in generators:
+                generator.cancel()
+            await asyncio.gather(*generators, return_exceptions=True)
+
+    async def _generate_subtasks(
+        self,
+        parent_task: Task,
+        num_subtasks: int,
+        existing_subtasks: Optional[List[Task]] = None,
+    ) -> List[dict]:
+        """
+        Ask the LLM to split a task and return the non-empty subtasks it suggests,
+        as items for bulk_create_tasks.
+        """
+        # Build the prompt, passing the existing subtasks
+        prompt = await self._build_split_prompt(
+            parent_task, num_subtasks, existing_subtasks
         )
 
         # Ask Mistral to process the prompt and return a structured JSON response
-        subtasks_response = await self.llm_service.ask_mistral(prompt)
+        started = time.monotonic()
+        subtasks_response = await self.llm_service.ask_mistral(prompt.text)
+        self.prompt_builder.record(prompt, time.monotonic() - started)
 
         # Try to parse the response as JSON
         try:
             subtasks = json.loads(subtasks_response)
         except json.JSONDecodeError:
             raise ValueError("Mistral response is not a valid JSON.")
+        if not isinstance(subtasks, list):
+            raise ValueError("Mistral response is not a JSON array.")
 
         # Validate each subtask contains both 'title' and 'description'
         for subtask in subtasks:
-            if (
-                not isinstance(subtask, dict)
-                or "title" not in subtask
-                or "description" not in subtask
+            self._validate_subtask(subtask)
+
+        # Keep only the non-empty subtasks
+        items = []
+        for subtask in subtasks:
+            subtask_title = str(subtask.get("title", "")).strip()
+            subtask_description = str(subtask.get("description", "")).strip()
+            if subtask_title and subtask_description:
+                items.append(
+                    {
+                        "title": subtask_title,
+                        "description": subtask_description,
+                        "parent_task_id": parent_task.id,
+                    }
+                )
+        return items
+
+    async def bulk_create_tasks(self, user_id, items: List[dict]) -> List[Task]:
+        """
+        Create many tasks for the given user in a single transaction and a single
+        INSERT round trip. Each item needs a title and may carry a description,
+        a status and a parent_task_id (a project by default).
+        Ids and creation times are generated here, so the returned tasks are
+        complete without re-reading them, and listings keep the items' order.
+        """
+        if not items:
+            return []
+
+        async with in_transaction() as conn:
+            parent_paths = await self._get_paths(
+                {item.get("parent_task_id") for item in items}, conn
+            )
+            tasks = self._build_tasks(user_id, items, parent_paths)
+            await self._insert_tasks(tasks, conn)
+
+        await self._invalidate(user_id, *{task.parent_task_id for task in tasks})
+        return tasks
+
+    async def apply_batch(self, user_id, operations: List[dict]) -> List[dict]:
+        """
+        Apply a batch of create, update and delete operations for the given user.
+        Targets and parents of the whole batch are locked and checked with one
+        query, in the transaction that then applies every valid operation, with
+        a number of statements that does not depend on the batch size.
+        Returns one result per operation, in order, with its HTTP-like 'status'
+        and either the affected 'task' or an 'error'.
+        """
+        results: List[Optional[dict]] = [None] * len(operations)
+
+        def fail(index: int, status: int, error: str) -> None:
+            results[index] = {"status": status, "error": error}
+
+        # Check the shape of every operation and collect the ids it refers to
+        parsed = {}
+        referenced = set()
+        targeted = set()
+        deleted = set()
+        for index, operation in enumerate(operations):
+            op = operation.get("op") if isinstance(operation, dict) else None
+            if op not in ("create", "update", "delete"):
+                fail(index, 400, "op must be one of create, update or delete")
+                continue
+
+            task_id = parent_id = None
+            try:
+                if op != "create":
+                    task_id = UUID(str(operation.get("uuid")))
+                if operation.get("parent_uuid"):
+                    parent_id = UUID(str(operation["parent_uuid"]))
+            except ValueError:
+                fail(index, 400, "Invalid task ID")
+                continue
+
+            if op == "create" and not operation.get("title"):
+                fail(index, 400, "Title is required")
+                continue
+            # Caught here, a bad item would otherwise fail the whole transaction
+            title, description = operation.get("title"), operation.get("description")
+            if not isinstance(title, (str, type(None))) or not isinstance(
+                description, (str, type(None))
             ):
-                raise ValueError(
-                    "Each subtask must contain both 'title' and 'description' keys."
+                fail(index, 400, "title and description must be strings")
+                continue
+            if title and len(title) > TITLE_MAX_LENGTH:
+                fail(index, 400, f"title must be at most {TITLE_MAX_LENGTH} characters")
+                continue
+            if task_id is not None:
+                if str(task_id) == ROOT_TASK_ID:
+                    fail(index, 400, "Project parent task cannot be modified")
+                    continue
+                if task_id in targeted:
+                    fail(index, 409, "Task is already modified in this batch")
+                    continue
+                if task_id == parent_id:
+                    fail(index, 400, "A task cannot be its own parent")
+                    continue
+                targeted.add(task_id)
+                referenced.add(task_id)
+                if op == "delete":
+                    deleted.add(task_id)
+            if parent_id is not None and str(parent_id) != ROOT_TASK_ID:
+                referenced.add(parent_id)
+
+            parsed[index] = (op, task_id, parent_id)
+
+        # The rows are read and locked in the transaction, never from the cache, so
+        # that the checks below and the writes see the same tree
+        deleted_ids = set()
+        async with in_transaction() as conn:
+            # One query checks the ownership of every target and parent
+            owned = {}
+            if referenced:
+                locked = (
+                    Task.filter(user_id=user_id, id__in=referenced)
+                    .using_db(conn)
+                    .select_for_update()
                 )
+                owned = {task.id: task for task in await locked}
 
-        # Create new tasks based on the generated subtasks
-        created_subtasks = []
-        for subtask in subtasks:
-            # Extract title and description from the subtask
-            subtask_title = subtask.get("title", "").strip()
-            subtask_description = subtask.get("description", "").strip()
+            # Tasks deleted in this batch take their subtrees with them
+            deleted_paths = [
+                owned[task_id].path for task_id in deleted if task_id in owned
+            ]
 
-            # Ensure that only non-empty subtasks are created
-            if subtask_title and subtask_description:
-                new_task = await Task.create(
-                    title=subtask_title,
-                    description=subtask_description,
-                    user=user,  # Use the user from the parent task
-                    parent_task=parent_task,  # Link to the parent task
-                    status="created",  # Set initial status to 'created'
+            def in_deleted_subtree(task_id) -> bool:
+                return any(
+                    owned[task_id].path.startswith(path) for path in deleted_paths
                 )
-                created_subtasks.append(new_task)
 
-        return created_subtasks
+            # How far below each task to move its deepest descendant lies, one query
+            heights = await self._subtree_heights(
+                [
+                    owned[task_id].path
+                    for op, task_id, parent_id in parsed.values()
+                    if op == "update"
+                    and task_id in owned
+                    and parent_id is not None
+                    and parent_id != owned[task_id].parent_task_id
+                ],
+                conn,
+            )
+
+            # Paths of the loaded tasks as the moves of the batch are replayed, in order
+            paths = {task_id: task.path for task_id, task in owned.items()}
+            moved_heights = {}
+
+            creates, updates, deletes = [], [], []
+            for index, (op, task_id, parent_id) in parsed.items():
+                operation = operations[index]
+                if task_id is not None and task_id not in owned:
+                    fail(index, 404, "Task not found")
+                    continue
+                if (
+                    op != "delete"
+                    and task_id is not None
+                    and in_deleted_subtree(task_id)
+                ):
+                    fail(index, 409, "Task is deleted in this batch")
+                    continue
+                if parent_id is not None and str(parent_id) != ROOT_TASK_ID:
+                    if parent_id not in owned:
+                        fail(index, 404, "Parent task not found")
+                        continue
+                    if in_deleted_subtree(parent_id):
+                        fail(index, 409, "Parent task is deleted in this batch")
+                        continue
+
+                if op == "create":
+                    creates.append(
+                        (
+                            index,
+                            {
+                                "title": operation["title"],
+                                "description": operation.get("description"),
+                                "parent_task_id": parent_id,
+                            },
+                        )
+                    )
+                elif op == "update":
+                    task = owned[task_id]
+                    if parent_id is not None and parent_id != task.parent_task_id:
+                        old_path = paths[task_id]
+                        parent_path = (
+                            ""
+                            if str(parent_id) == ROOT_TASK_ID
+                            else paths[parent_id]
+                        )
+                        try:
+                            new_path = self._child_path(parent_path, task_id)
+                        except ValueError as e:
+                            fail(index, 400, str(e))
+                            continue
+                        if new_path.startswith(old_path):
+                            fail(
+                                index,
+                                400,
+                                "A task cannot be moved under itself or one of its subtasks.",
+                            )
+                            continue
+
+                        # The deepest descendant must still fit within the depth
+                        # limit, subtrees moved under it earlier in the batch included
+                        height = heights[owned[task_id].path]
+                        for moved_id, moved_height in moved_heights.items():
+                            if paths[moved_id].startswith(old_path):
+                                depth = len(paths[moved_id]) - len(old_path)
+                                height = max(height, depth + moved_height)
+                        deepest_path = len(new_path) + height
+                        if deepest_path > PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH:
+                            fail(
+                                index,
+                                400,
+                                f"Tasks cannot be nested more than {MAX_TASK_DEPTH} levels deep.",
+                            )
+                            continue
+
+                        moved_heights[task_id] = height
+                        for loaded_id, path in paths.items():
+                            if path.startswith(old_path):
+                                paths[loaded_id] = new_path + path[len(old_path) :]
+                    updates.append((index, task, operation, parent_id))
+                else:
+                    deletes.append((index, owned[task_id]))
+
+            # New tasks go under their parents as they are once every move is applied
+            parent_paths = {str(task_id): path for task_id, path in paths.items()}
+            fitting = []
+            for index, item in creates:
+                parent_path = parent_paths.get(str(item["parent_task_id"]), "")
+                if len(parent_path) >= PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH:
+                    fail(
+                        index,
+                        400,
+                        f"Tasks cannot be nested more than {MAX_TASK_DEPTH} levels deep.",
+                    )
+                else:
+                    fitting.append((index, item))
+            creates = fitting
+            created = self._build_tasks(
+                user_id, [item for _, item in creates], parent_paths
+            )
+
+            # Apply the updates to the loaded rows, remembering the parents they
+            # leave, and group them by the columns they edit so that each row
+            # only has those written back
+            affected_parents = {task.parent_task_id for task in created}
+            updated = defaultdict(list)
+            for _, task, operation, parent_id in updates:
+                fields = []
+                if operation.get("title"):
+                    task.title = operation["title"]
+                    fields.append("title")
+                if operation.get("description"):
+                    task.description = operation["description"]
+                    fields.append("description")
+                if parent_id is not None and parent_id != task.parent_task_id:
+                    affected_parents.update((task.parent_task_id, parent_id))
+                    task.parent_task_id = parent_id
+                    fields.append("parent_task_id")
+                if fields:
+                    updated[tuple(fields)].append(task)
+            affected_parents.update(task.parent_task_id for _, task in deletes)
+
+            # The replay resolved chained moves: every moved subtree goes from its
+            # path before the batch straight to its final one
+            moves = [
+                (owned[task_id].path, paths[task_id]) for task_id in moved_heights
+            ]
+            for task_id, task in owned.items():
+                task.path = paths[task_id]
+            deleted_subtrees = [self._subtree_range(task.path) for _, task in deletes]
+
+            for fields, tasks in updated.items():
+                await Task.bulk_update(tasks, fields=list(fields), using_db=conn)
+            await self._rewrite_paths(moves, conn)
+            if created:
+                await Task.bulk_create(created, using_db=conn)
+            if deleted_subtrees:
+                subtrees = Task.filter(
+                    Q(*[Q(**subtree) for subtree in deleted_subtrees], join_type="OR"),
+                    user_id=user_id,
+                ).using_db(conn)
+                deleted_ids = set(await subtrees.values_list("id", flat=True))
+                await subtrees.delete()
+            await self._recount_subtasks(
+                {
+                    parent_id
+                    for parent_id in affected_parents
+                    if parent_id
+                    and str(parent_id) != ROOT_TASK_ID
+                    and parent_id not in deleted_ids
+                },
+                owned,
+                conn,
+            )
+
+        for (index, _), task in zip(creates, created):
+            results[index] = {"status": 201, "task": task}
+        for index, task, _, _ in updates:
+            results[index] = {"status": 200, "task": task}
+        for index, task in deletes:
+            results[index] = {"status": 200, "task": task}
+
+        await self._invalidate(
+            user_id,
+            *affected_parents,
+            *(task.id for _, task, _, _ in updates),
+            *(task.parent_task_id for _, task, _, _ in updates),
+            *deleted_ids,
+        )
+        return results
+
+    async def _recount_subtasks(self, parent_ids: set, loaded: dict, conn) -> None:
+        """
+        Set the subtask count of the given parents from one grouped count, and
+        write them back with one bulk update. 'loaded' maps ids to tasks already
+        in memory, so that only the other parents are fetched.
+        """
+        if not parent_ids:
+            return
+
+        counts = dict(
+            await Task.filter(parent_task_id__in=parent_ids)
+            .using_db(conn)
+            .group_by("parent_task_id")
+            .annotate(counted_subtasks=Count("id"))
+            .values_list("parent_task_id", "counted_subtasks")
+        )
+
+        parents = [loaded[parent_id] for parent_id in parent_ids if parent_id in loaded]
+        missing = parent_ids - set(loaded)
+        if missing:
+            parents.extend(await Task.filter(id__in=missing).using_db(conn))
+
+        for parent in parents:
+            parent.subtask_count = counts.get(parent.id, 0)
+        await Task.bulk_update(parents, fields=["subtask_count"], using_db=conn)
+
+    def _build_tasks(
+        self, user_id, items: List[dict], parent_paths: Dict[str, str]
+    ) -> List[Task]:
+        """
+        Build unsaved Task objects with their ids, paths and creation times assigned.
+        'parent_paths' maps the id of every non-root parent to its path.
+        """
+        now = timezone.now()
+        tasks = []
+        for position, item in enumerate(items):
+            task_id = uuid4()
+            parent_task_id = item.get("parent_task_id") or ROOT_TASK_ID
+            parent_path = (
+                "" if str(parent_task_id) == ROOT_TASK_ID
+                else parent_paths[str(parent_task_id)]
+            )
+            tasks.append(
+                Task(
+                    id=task_id,
+                    title=item["title"],
+                    description=item.get("description"),
+                    status=item.get("status", "created"),
+                    user_id=user_id,
+                    parent_task_id=parent_task_id,
+                    path=self._child_path(parent_path, task_id),
+                    # Distinct, increasing creation times preserve the order of the items
+                    created_at=now + timedelta(microseconds=position),
+                )
+            )
+        return tasks
+
+    async def _insert_tasks(self, tasks: List[Task], conn) -> None:
+        """
+        Insert built tasks with one bulk statement and add them to their parents'
+        subtask counts, with one update per distinct number of tasks added.
+        """
+        await Task.bulk_create(tasks, using_db=conn)
+
+        added = Counter(str(task.parent_task_id) for task in tasks)
+        added.pop(ROOT_TASK_ID, None)  # The root sentinel is never counted
+        parents_by_count = defaultdict(list)
+        for parent_task_id, count in added.items():
+            parents_by_count[count].append(parent_task_id)
+        for count, parent_task_ids in parents_by_count.items():
+            await (
+                Task.filter(id__in=parent_task_ids)
+                .using_db(conn)
+                .update(subtask_count=F("subtask_count") + count)
+            )
+
+    async def split_task_stream(
+        self,
+        parent_task: Task,
+        num_subtasks: int = 2,
+    ) -> AsyncIterator[Task]:
+        """
+        Split a task like split_task, but stream the LLM response and create each
+        subtask as soon as its JSON object is complete, yielding it right away.
+        """
+        if num_subtasks < 1:
+            raise ValueError("The number of subtasks must be at least 1.")
+
+        prompt = await self._build_split_prompt(parent_task, num_subtasks)
+        parser = JSONArrayStream()
+        created = 0
+
+        try:
+            # Read the stream to its end so that the full response gets cached
+            started = time.monotonic()
+            chunks = self.llm_service.stream_mistral(prompt.text)
+            try:
+                async for chunk in chunks:
+                    try:
+                        subtasks = parser.feed(chunk)
+                    except json.JSONDecodeError:
+                        raise ValueError("Mistral response is not a valid JSON.")
+
+                    for subtask in subtasks:
+                        new_task = await self._create_subtask(parent_task, subtask)
+                        if new_task:
+                            created += 1
+                            yield new_task
+            finally:
+                await chunks.aclose()
+            self.prompt_builder.record(prompt, time.monotonic() - started)
+
+            if not created and not parser.done:
+                # No array was found while streaming, parse the response as a whole
+                response = self.llm_service.mistral_conn._strip_code_block_markers(
+                    parser.text
+                )
+                try:
+                    subtasks = json.loads(response)
+                except json.JSONDecodeError:
+                    raise ValueError("Mistral response is not a valid JSON.")
+                if not isinstance(subtasks, list):
+                    raise ValueError("Mistral response is not a JSON array.")
+
+                for subtask in subtasks:
+                    new_task = await self._create_subtask(parent_task, subtask)
+                    if new_task:
+                        yield new_task
+        finally:
+            await self._invalidate(parent_task.user_id, parent_task.id)
+
+    async def _create_subtask(self, parent_task: Task, subtask) -> Optional[Task]:
+        """
+        Validate a subtask object from the LLM and create it under the parent task,
+        keeping the parent's subtask count in step. Empty subtasks are skipped.
+        """
+        self._validate_subtask(subtask)
+
+        subtask_title = str(subtask.get("title", "")).strip()
+        subtask_description = str(subtask.get("description", "")).strip()
+        if not subtask_title or not subtask_description:
+            return None
+
+        task_id = uuid4()
+        async with in_transaction() as conn:
+            parent_path = await self._get_path(parent_task.id, conn)
+            new_task = await Task.create(
+                id=task_id,
+                title=subtask_title,
+                description=subtask_description,
+                user_id=parent_task.user_id,
+                parent_task_id=parent_task.id,
+                path=self._child_path(parent_path, task_id),
+                status="created",
+                using_db=conn,
+            )
+            await self._adjust_subtask_count(parent_task.id, 1, conn)
+        return new_task
+
+    async def _build_split_prompt(
+        self,
+        parent_task: Task,
+        num_subtasks: int,
+        existing_subtasks: Optional[List[Task]] = None,
+    ) -> SplitPrompt:
+        """
+        Build the prompt asking the LLM to split a task, listing its existing
+        subtasks within the token budget of the prompt builder.
+        """
+        builder = self.prompt_builder
+        _, _, allowance = builder.frame(
+            parent_task.title, parent_task.description, num_subtasks
+        )
+
+        # Listings too long to send in full are kept until a subtask changes
+        cache_key = f"split_listing:{parent_task.id}:{allowance}"
+        tags = [f"children:{parent_task.id}"]
+        existing = None
+        if self.cache and existing_subtasks is None:
+            existing = await self.cache.get(cache_key)
+            if existing is None:
+                since = await self.cache.generations(tags)
+
+        if existing is None:
+            # Fetch existing subtasks from the database, unless the caller has them
+            if existing_subtasks is None:
+                rows = (
+                    await Task.filter(parent_task=parent_task)
+                    .order_by("created_at", "id")
+                    .values_list("title", "description")
+                )
+            else:
+                rows = [
+                    (subtask.title, subtask.description)
+                    for subtask in existing_subtasks
+                ]
+
+            existing = builder.list_existing(rows, allowance)
+            if self.cache and existing_subtasks is None and existing["mode"] != "full":
+                await self.cache.set(cache_key, existing, tags=tags, since=since)
+
+        return builder.build(
+            parent_task.title, parent_task.description, num_subtasks, existing
+        )
+
+    @staticmethod
+    def _validate_subtask(subtask) -> None:
+        """
+        Check that a subtask from the LLM has both a title and a description.
+        """
+        if (
+            not isinstance(subtask, dict)
+            or "title" not in subtask
+            or "description" not in subtask
+        ):
+            raise ValueError(
+                "Each subtask must contain both 'title' and 'description' keys."
+            )
+
+    async def _get_path(self, task_id, conn) -> str:
+        """
+        Read the current materialized path of a task; projects hang off the root,
+        whose path is empty.
+        """
+        if not task_id or str(task_id) == ROOT_TASK_ID:
+            return ""
+
+        path = (
+            await Task.filter(id=task_id)
+            .using_db(conn)
+            .first()
+            .values_list("path", flat=True)
+        )
+        if path is None:
+            raise ValueError("Parent task not found")
+        return path
+
+    async def _get_paths(self, task_ids, conn) -> Dict[str, str]:
+        """
+        Read the current paths of many tasks with one query, keyed by string id.
+        The root sentinel is left out, its path being empty.
+        """
+        task_ids = {
+            str(task_id)
+            for task_id in task_ids
+            if task_id and str(task_id) != ROOT_TASK_ID
+        }
+        if not task_ids:
+            return {}
+
+        rows = (
+            await Task.filter(id__in=task_ids)
+            .using_db(conn)
+            .values_list("id", "path")
+        )
+        paths = {str(task_id): path for task_id, path in rows}
+        if len(paths) < len(task_ids):
+            raise ValueError("Parent task not found")
+        return paths
+
+    @staticmethod
+    def _child_path(parent_path: str, task_id) -> str:
+        """
+        Build the path of a task under the given parent path, within the depth limit.
+        """
+        path = parent_path + path_segment(task_id)
+        if len(path) > PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH:
+            raise ValueError(
+                f"Tasks cannot be nested more than {MAX_TASK_DEPTH} levels deep."
+            )
+        return path
+
+    @staticmethod
+    def _subtree_range(path: str) -> dict:
+        """
+        Filter matching a task and all its descendants, as one range of the path index.
+        Path separators sort right below the hex digits, so every path that starts
+        with the task's path lies between it and its path with the last "/" bumped.
+        """
+        return {"path__gte": path, "path__lt": path[:-1] + "0"}
+
+    async def _subtree_heights(self, paths: List[str], conn) -> Dict[str, int]:
+        """
+        For each task path, how much longer the path of its deepest descendant is,
+        in one statement whatever the number of paths.
+        """
+        if not paths:
+            return {}
+
+        placeholder = "%s" if conn.capabilities.dialect == "mysql" else "?"
+        sql = " UNION ALL ".join(
+            f"SELECT {placeholder} AS root, MAX(LENGTH(path)) AS longest "
+            f"FROM tasks WHERE path >= {placeholder} AND path < {placeholder}"
+            for _ in paths
+        )
+        params = []
+        for path in paths:
+            subtree = self._subtree_range(path)
+            params += [path, subtree["path__gte"], subtree["path__lt"]]
+
+        _, rows = await conn.execute_query(sql, params)
+        return {
+            row["root"]: max((row["longest"] or 0) - len(row["root"]), 0)
+            for row in rows
+        }
+
+    async def _move_subtree(self, task: Task, conn) -> str:
+        """
+        Rewrite the paths of a task and its descendants for its new parent, with
+        a constant number of queries. Returns the new path of the task.
+        """
+        old_path = await self._get_path(task.id, conn)
+        new_path = self._child_path(
+            await self._get_path(task.parent_task_id, conn), task.id
+        )
+        if new_path.startswith(old_path):
+            raise ValueError(
+                "A task cannot be moved under itself or one of its subtasks."
+            )
+
+        # The deepest descendant must still fit within the depth limit
+        subtree = Task.filter(**self._subtree_range(old_path)).using_db(conn)
+        longest = (
+            await subtree.annotate(longest=Max(Length("path")))
+            .first()
+            .values_list("longest", flat=True)
+        )
+        deepest_path = len(new_path) + (longest or 0) - len(old_path)
+        if deepest_path > PATH_SEGMENT_LENGTH * MAX_TASK_DEPTH:
+            raise ValueError(
+                f"Tasks cannot be nested more than {MAX_TASK_DEPTH} levels deep."
+            )
+
+        await self._rewrite_paths([(old_path, new_path)], conn)
+        return new_path
+
+    async def _rewrite_paths(self, prefixes: List[Tuple[str, str]], conn) -> None:
+        """
+        Replace the old prefix of every path in one or more subtrees by its new
+        one, given as (old_path, new_path) pairs, in one statement. A path in
+        several of the subtrees takes the new prefix of the deepest one.
+        """
+        if not prefixes:
+            return
+
+        if conn.capabilities.dialect == "mysql":
+            placeholder, replace = "%s", "CONCAT(%s, SUBSTRING(path, %s))"
+        else:
+            placeholder, replace = "?", "? || SUBSTR(path, ?)"
+        in_subtree = f"path >= {placeholder} AND path < {placeholder}"
+
+        # Deepest subtrees first, so that CASE picks them over their ancestors
+        prefixes = sorted(prefixes, key=lambda prefix: len(prefix[0]), reverse=True)
+        subtrees = [self._subtree_range(old_path) for old_path, _ in prefixes]
+        sql = (
+            "UPDATE tasks SET path = CASE "
+            + " ".join(f"WHEN {in_subtree} THEN {replace}" for _ in prefixes)
+            + " END WHERE "
+            + " OR ".join(f"({in_subtree})" for _ in prefixes)
+        )
+
+        params = []
+        for (old_path, new_path), subtree in zip(prefixes, subtrees):
+            params += [subtree["path__gte"], subtree["path__lt"]]
+            params += [new_path, len(old_path) + 1]
+        for subtree in subtrees:
+            params += [subtree["path__gte"], subtree["path__lt"]]
+        await conn.execute_query(sql, params)
+
+    async def _adjust_subtask_count(self, parent_task_id, delta: int, conn) -> None:
+        """
+        Add 'delta' to the denormalized subtask count of a parent task.
+        Projects hang off the root sentinel, which is never counted.
+        """
+        if not parent_task_id or str(parent_task_id) == ROOT_TASK_ID or not delta:
+            return
+
+        await (
+            Task.filter(id=parent_task_id)
+            .using_db(conn)
+            .update(subtask_count=F("subtask_count") + delta)
+        )
+
+    async def _invalidate(self, user_id, *task_ids) -> None:
+        """
+        Drop cached reads affected by a write: the user's project listing and,
+        for every given task, its detail and its subtask pages. Their versions
+        are bumped too, so the ETags handed out for them no longer match.
+        """
+        if not self.cache:
+            return
+
+        tags = [f"user:{user_id}"]
+        versions = [f"user:{user_id}"]
+        for task_id in {str(task_id) for task_id in task_ids if task_id}:
+            tags.extend((f"task:{task_id}", f"children:{task_id}"))
+            versions.append(f"task:{user_id}:{task_id}")
+
+        await self.cache.invalidate_tags(*tags)
+        await self.cache.bump_versions(*versions)
+
+    @staticmethod
+    def _encode_cursor(task: Task) -> str:
+        """
+        Build an opaque cursor pointing right after the given task.
+        """
+        position = json.dumps([task.created_at.isoformat(), str(task.id)])
+        encoded = base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+        return encoded.rstrip("=")  # Padding is restored when decoding
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+        """
+        Read the (created_at, id) position back from a cursor.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created_at, last_id = json.loads(base64.urlsafe_b64decode(padded))
+            return datetime.fromisoformat(created_at), UUID(last_id)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def _encode_search_cursor(score: float, task_id: str) -> str:
+        """
+        Build an opaque cursor pointing right after a search result.
+        """
+        position = json.dumps([score, task_id])
+        encoded = base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+        return encoded.rstrip("=")
+
+    @staticmethod
+    def _decode_search_cursor(cursor: str) -> Tuple[float, str]:
+        """
+        Read the (score, id) position back from a search cursor.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            score, last_id = json.loads(base64.urlsafe_b64decode(padded))
+            return float(score), str(UUID(last_id))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def _task_to_row(task: Task) -> dict:
+        """
+        Convert a task into a JSON serializable row for the cache.
+        """
+        return {
+            "id": str(task.id),
+            "title": task.title,
+            "description": task.description,
+            "status": task.status,
+            "created_at": task.created_at.isoformat(),
+            "user_id": str(task.user_id),
+            "parent_task_id": (
+                str(task.parent_task_id) if task.parent_task_id else None
+            ),
+            "subtask_count": task.subtask_count,
+            "path": task.path,
+        }
+
+    @staticmethod
+    def _task_from_row(row: dict) -> Task:
+        """
+        Rebuild a task from a cached row, as if it had been loaded from the database.
+        """
+        return Task._init_from_db(**row)
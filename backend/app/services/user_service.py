@@ -2,13 +2,19 @@
 
 import jwt
 import datetime
-import bcrypt
 from sanic.exceptions import SanicException
 from models.User import User
+from services.password_hasher import PasswordHasher
 from config import Config
 
 
 class UserService:
+    def __init__(self, password_hasher: PasswordHasher):
+        """
+        Initialize the UserService with the pool used to hash passwords.
+        """
+        self.password_hasher = password_hasher
+
     async def create_user(self, display_name: str, email: str, password: str) -> User:
         """
         Create a new user with a hashed password.
@@ -18,10 +24,8 @@ class UserService:
         if existing_user:
             raise SanicException("User already exists", status_code=400)
 
-        # Hash the password using bcrypt
-        hashed_password = bcrypt.hashpw(
-            password.encode("utf-8"), bcrypt.gensalt()
-        ).decode("utf-8")
+        # Hash the password using bcrypt, off the event loop
+        hashed_password = await self.password_hasher.hash(password)
 
         # Create the user and save to database
         user = await User.create(
@@ -39,9 +43,14 @@ class UserService:
             raise SanicException("Invalid credentials", status_code=401)
 
         # Verify password
-        if not bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+        if not await self.password_hasher.verify(password, user.password):
             raise SanicException("Invalid credentials", status_code=401)
 
+        # Upgrade hashes made with an outdated cost factor while we have the password
+        if self.password_hasher.needs_rehash(user.password):
+            user.password = await self.password_hasher.hash(password)
+            await user.save(update_fields=["password"])
+
         return user
 
     def create_access_token(self, user: User) -> str:
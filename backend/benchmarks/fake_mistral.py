@@ -0,0 +1,135 @@
+# benchmarks/fake_mistral.py
+#
+# A local stand-in for the Mistral chat completions API, with configurable
+# latency and failures. Requests with "stream": true are answered with
+# Server-Sent Events, the latency being spread over the chunks. Point the app
+# at it with MISTRAL_SERVER_URL:
+#
+#     python benchmarks/fake_mistral.py --port 8100 --latency 1.5 --error-rate 0.1
+#     MISTRAL_SERVER_URL=http://127.0.0.1:8100 python app/app.py
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from aiohttp import web
+
+
+def fake_subtasks(prompt: str) -> list:
+    """
+    Build as many subtasks as the split prompt asks for.
+    """
+    match = re.search(r"maximum of (\d+)", prompt)
+    count = int(match.group(1)) if match else 2
+    title = re.search(r"Title: (.*)", prompt)
+    parent = title.group(1).strip() if title else "Task"
+    return [
+        {
+            "title": f"{parent} - step {i + 1}",
+            "description": f"Generated step {i + 1} of {count} for {parent}.",
+        }
+        for i in range(count)
+    ]
+
+
+async def stream_content(
+    request: web.Request, body: dict, content: str, delay: float
+) -> web.StreamResponse:
+    """
+    Send the content as chat completion chunks of a few characters each.
+    """
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+
+    completion_id = uuid.uuid4().hex
+    pieces = [content[i : i + 16] for i in range(0, len(content), 16)]
+    for index, piece in enumerate(pieces):
+        await asyncio.sleep(delay / len(pieces))
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": piece},
+                    "finish_reason": "stop" if index == len(pieces) - 1 else None,
+                }
+            ],
+        }
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+def create_app(latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0):
+    app = web.Application()
+    app["stats"] = {"requests": 0, "errors": 0}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        app["stats"]["requests"] += 1
+
+        delay = max(0.0, latency + random.uniform(-jitter, jitter))
+        if random.random() < error_rate:
+            await asyncio.sleep(delay)
+            app["stats"]["errors"] += 1
+            return web.json_response({"message": "Service unavailable"}, status=503)
+
+        prompt = body["messages"][-1]["content"]
+        content = "```json\n" + json.dumps(fake_subtasks(prompt), indent=2) + "\n```"
+        if body.get("stream"):
+            return await stream_content(request, body, content, delay)
+
+        await asyncio.sleep(delay)
+        return web.json_response(
+            {
+                "id": uuid.uuid4().hex,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": (len(prompt) + len(content)) // 4,
+                },
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+        )
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(app["stats"])
+
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Mistral chat API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of calls answered with 503"
+    )
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(args.latency, args.jitter, args.error_rate),
+        host=args.host,
+        port=args.port,
+    )
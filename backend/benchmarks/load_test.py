@@ -0,0 +1,537 @@
+# benchmarks/load_test.py
+#
+# HTTP load test of every task and user route. Boots the app in this process
+# on SQLite (in memory unless --db is given), with the fake Mistral API of
+# fake_mistral.py answering splits after --llm-latency seconds. Seeds --users
+# users with task trees, then sends --requests requests to each route from
+# --concurrency clients, one route after the other, and reports throughput,
+# latency percentiles and SQL queries per request:
+#
+#     python benchmarks/load_test.py --users 20 --requests 200 --output load.json
+#
+# The report is written as JSON with sorted keys, to be diffed between commits.
+# Exits with status 1 when a route sends more SQL statements per request than
+# its budget in QUERY_BUDGETS. Passwords are hashed with BCRYPT_ROUNDS=4 unless
+# the environment sets it, so the auth routes measure the server, not bcrypt.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+from fake_mistral import create_app as create_fake_mistral  # noqa: E402
+
+ROOT_TASK_ID = "00000000-0000-0000-0000-000000000000"
+PASSWORD = "load-test-password"
+WORDS = (
+    "plan review draft budget invoice meeting design release deploy backup "
+    "report hiring onboarding roadmap audit migrate refactor document test "
+    "marketing launch survey contract renew garden kitchen travel visa booking "
+    "workshop slides training support ticket feedback newsletter"
+).split()
+
+
+class QueryCounter:
+    """
+    Count every SQL statement the app sends, and collect the per-request
+    counts it reports in the X-Query-Count header.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.per_request = []
+
+    def __call__(self, query: str, seconds: float, failed: bool) -> None:
+        self.count += 1
+
+    async def on_request_end(self, session, context, params) -> None:
+        count = params.response.headers.get("X-Query-Count")
+        if count is not None:
+            self.per_request.append(int(count))
+
+
+class User:
+    def __init__(self, email: str, token: str, user_id: str) -> None:
+        self.email = email
+        self.token = token
+        self.user_id = user_id
+        self.projects = []
+        self.tasks = []  # Every task below the projects
+        self.leaves = []
+        self.branches = []  # Tasks whose subtasks are leaves, for split/all
+        self.disposable = []  # Tasks created for the DELETE route to remove
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+def title(rng: random.Random) -> str:
+    return " ".join(rng.sample(WORDS, 3)).capitalize()
+
+
+def description(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(8, 20))).capitalize() + "."
+
+
+async def check(response: aiohttp.ClientResponse, *statuses: int) -> dict:
+    body = await response.read()
+    if response.status not in statuses:
+        raise RuntimeError(
+            f"{response.method} {response.url.path}: {response.status} {body[:200]!r}"
+        )
+    return json.loads(body) if body else {}
+
+
+async def register(session, base_url: str, email: str) -> User:
+    async with session.post(
+        f"{base_url}/auth/register",
+        json={"username": email.split("@")[0], "email": email, "password": PASSWORD},
+    ) as response:
+        data = await check(response, 200)
+    return User(email, data["token"], data["user"]["uuid"])
+
+
+async def create_tasks(session, base_url: str, user: User, operations: list) -> list:
+    """
+    Create tasks through /tasks/batch and return their ids, in order.
+    """
+    task_ids = []
+    for offset in range(0, len(operations), 200):
+        async with session.post(
+            f"{base_url}/tasks/batch",
+            json={"operations": operations[offset : offset + 200]},
+            headers=user.headers,
+        ) as response:
+            data = await check(response, 200)
+        task_ids.extend(result["task"]["uuid"] for result in data["results"])
+    return task_ids
+
+
+async def seed(session, base_url: str, args, rng: random.Random) -> list:
+    """
+    Register the users and give each of them projects, every project a tree of
+    --branching subtasks per task, --depth levels deep.
+    """
+    from tortoise import connections
+
+    users = [
+        await register(session, base_url, f"user{i}@example.com")
+        for i in range(args.users)
+    ]
+
+    # Projects hang off the sentinel root task, which must exist
+    await connections.get("default").execute_query(
+        "INSERT INTO tasks (id, title, status, created_at, user_id, subtask_count, "
+        "path) VALUES (?, 'root', 'created', CURRENT_TIMESTAMP, ?, 0, '')",
+        [ROOT_TASK_ID, users[0].user_id],
+    )
+
+    for user in users:
+        level = await create_tasks(
+            session,
+            base_url,
+            user,
+            [
+                {"op": "create", "title": title(rng), "description": description(rng)}
+                for _ in range(args.projects)
+            ],
+        )
+        user.projects = level
+        for _ in range(args.depth):
+            user.branches = level
+            level = await create_tasks(
+                session,
+                base_url,
+                user,
+                [
+                    {
+                        "op": "create",
+                        "title": title(rng),
+                        "description": description(rng),
+                        "parent_uuid": parent,
+                    }
+                    for parent in level
+                    for _ in range(args.branching)
+                ],
+            )
+            user.tasks.extend(level)
+        user.leaves = level
+    return users
+
+
+# Each route is a coroutine sending one request as the given user
+async def get_projects(session, base_url, user, rng):
+    async with session.get(f"{base_url}/projects", headers=user.headers) as response:
+        await check(response, 200)
+
+
+async def get_task(session, base_url, user, rng):
+    task_id = rng.choice(user.projects + user.tasks)
+    async with session.get(
+        f"{base_url}/tasks/{task_id}", headers=user.headers
+    ) as response:
+        await check(response, 200)
+
+
+async def search_tasks(session, base_url, user, rng):
+    async with session.get(
+        f"{base_url}/tasks/search",
+        params={"q": rng.choice(WORDS)},
+        headers=user.headers,
+    ) as response:
+        await check(response, 200)
+
+
+async def get_task_tree(session, base_url, user, rng):
+    async with session.get(
+        f"{base_url}/tasks/{rng.choice(user.projects)}/tree", headers=user.headers
+    ) as response:
+        await check(response, 200)
+
+
+async def get_task_ancestors(session, base_url, user, rng):
+    async with session.get(
+        f"{base_url}/tasks/{rng.choice(user.leaves)}/ancestors", headers=user.headers
+    ) as response:
+        await check(response, 200)
+
+
+async def create_task(session, base_url, user, rng):
+    async with session.post(
+        f"{base_url}/tasks",
+        json={
+            "title": title(rng),
+            "description": description(rng),
+            "parent_uuid": rng.choice(user.projects),
+        },
+        headers=user.headers,
+    ) as response:
+        await check(response, 201)
+
+
+async def edit_task(session, base_url, user, rng):
+    async with session.patch(
+        f"{base_url}/tasks/{rng.choice(user.leaves)}",
+        json={"title": title(rng), "description": description(rng)},
+        headers=user.headers,
+    ) as response:
+        await check(response, 200)
+
+
+async def batch_tasks(session, base_url, user, rng):
+    parent = rng.choice(user.projects)
+    operations = [
+        {"op": "create", "title": title(rng), "parent_uuid": parent} for _ in range(5)
+    ] + [
+        {"op": "update", "uuid": task_id, "description": description(rng)}
+        for task_id in rng.sample(user.leaves, 5)
+    ]
+    async with session.post(
+        f"{base_url}/tasks/batch", json={"operations": operations}, headers=user.headers
+    ) as response:
+        await check(response, 200)
+
+
+async def delete_task(session, base_url, user, rng):
+    async with session.delete(
+        f"{base_url}/tasks/{user.disposable.pop()}", headers=user.headers
+    ) as response:
+        await check(response, 200)
+
+
+async def split_task(session, base_url, user, rng):
+    async with session.post(
+        f"{base_url}/tasks/{rng.choice(user.leaves)}/split",
+        json={"count": 2},
+        headers=user.headers,
+    ) as response:
+        await check(response, 200)
+
+
+async def split_task_stream(session, base_url, user, rng):
+    async with session.post(
+        f"{base_url}/tasks/{rng.choice(user.leaves)}/split/stream",
+        json={"count": 2},
+        headers=user.headers,
+    ) as response:
+        body = await response.text()
+        if response.status != 200 or "event: done" not in body:
+            raise RuntimeError(f"split stream: {response.status} {body[-200:]!r}")
+
+
+async def split_all_subtasks(session, base_url, user, rng):
+    # Every request splits leaves of its own while there are some left
+    branch = user.branches.pop() if user.branches else rng.choice(user.projects)
+    async with session.post(
+        f"{base_url}/tasks/{branch}/split/all", json={"count": 2}, headers=user.headers
+    ) as response:
+        body = await response.text()
+        if response.status != 200 or "event: done" not in body:
+            raise RuntimeError(f"split all: {response.status} {body[-200:]!r}")
+
+
+async def login(session, base_url, user, rng):
+    async with session.post(
+        f"{base_url}/auth/login", json={"email": user.email, "password": PASSWORD}
+    ) as response:
+        await check(response, 200)
+
+
+_registrations = itertools.count()
+
+
+async def register_user(session, base_url, user, rng):
+    await register(session, base_url, f"load{next(_registrations)}@example.com")
+
+
+# Reads first, then writes, so that every run reads the same seeded trees
+ROUTES = {
+    "GET /projects": get_projects,
+    "GET /tasks/<task_id>": get_task,
+    "GET /tasks/search": search_tasks,
+    "GET /tasks/<task_id>/tree": get_task_tree,
+    "GET /tasks/<task_id>/ancestors": get_task_ancestors,
+    "POST /tasks": create_task,
+    "PATCH /tasks/<task_id>": edit_task,
+    "POST /tasks/batch": batch_tasks,
+    "DELETE /tasks/<task_id>": delete_task,
+    "POST /tasks/<task_id>/split": split_task,
+    "POST /tasks/<task_id>/split/stream": split_task_stream,
+    "POST /tasks/<task_id>/split/all": split_all_subtasks,
+    "POST /auth/login": login,
+    "POST /auth/register": register_user,
+}
+
+
+# Most SQL statements a request to each route may send, on average and at most.
+# Streamed responses report the statements sent before their headers only, so
+# their budget is checked against the average.
+QUERY_BUDGETS = {
+    "GET /projects": 1,
+    "GET /tasks/<task_id>": 2,
+    "GET /tasks/search": 1,
+    "GET /tasks/<task_id>/tree": 1,
+    "GET /tasks/<task_id>/ancestors": 3,
+    "POST /tasks": 4,
+    "PATCH /tasks/<task_id>": 2,
+    "POST /tasks/batch": 5,
+    "DELETE /tasks/<task_id>": 4,
+    "POST /tasks/<task_id>/split": 5,
+    "POST /tasks/<task_id>/split/stream": 8,
+    "POST /tasks/<task_id>/split/all": 11,
+    "POST /auth/login": 1,
+    "POST /auth/register": 2,
+}
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_route(session, base_url, name, users, args, counter) -> dict:
+    """
+    Send --requests requests to one route from --concurrency clients, each
+    client acting as one of the users.
+    """
+    route = ROUTES[name]
+    rng = random.Random(f"{args.seed}:{name}")
+    if route is delete_task:
+        # Every DELETE removes a task of its own, created beforehand
+        per_user = args.requests // len(users) + args.concurrency
+        for user in users:
+            user.disposable = await create_tasks(
+                session,
+                base_url,
+                user,
+                [
+                    {"op": "create", "title": title(rng), "parent_uuid": project}
+                    for project in rng.choices(user.projects, k=per_user)
+                ],
+            )
+
+    remaining = itertools.count()
+    latencies, errors = [], []
+
+    async def client(user: User) -> None:
+        while next(remaining) < args.requests:
+            started = time.perf_counter()
+            try:
+                await route(session, base_url, user, rng)
+            except (RuntimeError, aiohttp.ClientError) as e:
+                errors.append(str(e))
+            latencies.append(time.perf_counter() - started)
+
+    queries = counter.count
+    counter.per_request = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(users[i % len(users)]) for i in range(args.concurrency))
+    )
+    elapsed = time.perf_counter() - started
+    queries = counter.count - queries
+
+    if errors:
+        print(f"  {name}: {len(errors)} errors, first: {errors[0]}", file=sys.stderr)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round(queries / len(latencies), 2),
+        "max_queries": max(counter.per_request, default=0),
+        "query_budget": QUERY_BUDGETS[name],
+    }
+
+
+def over_budget(result: dict) -> bool:
+    budget = result["query_budget"]
+    return result["queries_per_request"] > budget or result["max_queries"] > budget
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args) -> dict:
+    # The fake Mistral API must be listening before the app reads its URL
+    fake_mistral = web.AppRunner(create_fake_mistral(latency=args.llm_latency))
+    await fake_mistral.setup()
+    await web.TCPSite(fake_mistral, "127.0.0.1", args.llm_port).start()
+
+    # Config reads the environment once, when the app is imported
+    os.environ.update(
+        DATABASE_URI=f"sqlite://{args.db}",
+        REDIS_URI="",
+        MISTRAL_API_KEY="load-test",
+        MISTRAL_SERVER_URL=f"http://127.0.0.1:{args.llm_port}",
+        QUERY_HEADERS="True",
+        METRICS_TOKEN="load-test",  # Measured with metrics on, as deployed
+    )
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    from tortoise import connections
+    from connections.database import observe_queries
+    from migrations import run_migrations
+    from app import app
+
+    server = await app.create_server(
+        host="127.0.0.1",
+        port=args.port,
+        access_log=False,
+        return_asyncio_server=True,
+    )
+    await server.startup()
+    await server.before_start()
+    counter = QueryCounter()
+    observe_queries(counter)
+    await run_migrations(connections.get("default"))
+    await server.after_start()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    report = {
+        "commit": git_commit(),
+        "settings": {
+            "users": args.users,
+            "projects": args.projects,
+            "branching": args.branching,
+            "depth": args.depth,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "bcrypt_rounds": int(os.environ["BCRYPT_ROUNDS"]),
+            "seed": args.seed,
+        },
+        "routes": {},
+    }
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(counter.on_request_end)
+        async with aiohttp.ClientSession(
+            connector=connector, trace_configs=[trace]
+        ) as session:
+            started = time.perf_counter()
+            users = await seed(session, base_url, args, random.Random(args.seed))
+            tasks = sum(len(user.projects) + len(user.tasks) for user in users)
+            print(
+                f"Seeded {args.users} users with {tasks} tasks "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+            print(
+                f"{'route':<36}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+                f"{'p99 ms':>9}{'queries':>9}{'max':>5}{'budget':>8}{'errors':>8}"
+            )
+            for name in ROUTES:
+                result = await run_route(session, base_url, name, users, args, counter)
+                report["routes"][name] = result
+                flag = "  OVER BUDGET" if over_budget(result) else ""
+                print(
+                    f"{name:<36}{result['requests_per_second']:>9.1f}"
+                    f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                    f"{result['p99_ms']:>9.1f}{result['queries_per_request']:>9.2f}"
+                    f"{result['max_queries']:>5}{result['query_budget']:>8}"
+                    f"{result['errors']:>8}{flag}"
+                )
+    finally:
+        await server.before_stop()
+        server.close()
+        await server.wait_closed()
+        await server.after_stop()
+        await fake_mistral.cleanup()
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load test of the API.")
+    parser.add_argument("--db", default=":memory:", help="SQLite file, or :memory:")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=10, help="per user")
+    parser.add_argument("--branching", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="seconds")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--llm-port", type=int, default=8120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.db != ":memory:" and os.path.exists(args.db):
+        parser.error(f"{args.db} already exists, remove it or pick another file")
+
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    over = [name for name, result in report["routes"].items() if over_budget(result)]
+    if over:
+        print(f"FAIL  over their query budget: {', '.join(over)}")
+        sys.exit(1)
@@ -0,0 +1,177 @@
+# benchmarks/search.py
+#
+# Latency of TaskService.search_tasks on a large SQLite database, indexed with
+# FTS5 by the migrations. The database is seeded once and reused by later runs:
+#
+#     python benchmarks/search.py --tasks 1000000 --users 1000 --queries 200
+#
+# Exits with status 1 when the 95th percentile exceeds --budget-ms.
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from tortoise import Tortoise, connections  # noqa: E402
+from tortoise.transactions import in_transaction  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models.Task import path_segment  # noqa: E402
+from services.task_service import TaskService  # noqa: E402
+
+BATCH_SIZE = 10000
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    """
+    Made-up words, drawn with Zipf-like frequencies as in natural text.
+    """
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def sentence(words: list, cum_weights: list, length: int, rng: random.Random) -> str:
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=length))
+
+
+async def seed(
+    conn, tasks: int, users: list, words: list, cum_weights: list, rng
+) -> None:
+    """
+    Insert tasks for the given users, the FTS5 triggers indexing every row.
+    """
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    await conn.execute_many(
+        "INSERT INTO users (uuid, email, display_name, password) VALUES (?, ?, ?, ?)",
+        [
+            [user, f"user{i}@example.com", f"user{i}", "x"]
+            for i, user in enumerate(users)
+        ],
+    )
+
+    task_sql = (
+        "INSERT INTO tasks (id, title, description, status, created_at, user_id, "
+        "parent_task_id, subtask_count, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    for offset in range(0, tasks, BATCH_SIZE):
+        rows = []
+        for i in range(offset, min(offset + BATCH_SIZE, tasks)):
+            task_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+            rows.append(
+                [
+                    str(task_id),
+                    sentence(words, cum_weights, rng.randint(3, 7), rng),
+                    sentence(words, cum_weights, rng.randint(10, 25), rng),
+                    "created",
+                    (started + timedelta(seconds=i)).isoformat(),
+                    rng.choice(users),
+                    None,
+                    0,
+                    path_segment(task_id),
+                ]
+            )
+        # One transaction per batch, instead of one commit per row
+        async with in_transaction() as tx:
+            await tx.execute_many(task_sql, rows)
+        print(f"  seeded {offset + len(rows)}/{tasks} tasks", end="\r", flush=True)
+    print()
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def main(args) -> int:
+    rng = random.Random(args.seed)
+    words = vocabulary(args.words, rng)
+    cum_weights = list(
+        itertools.accumulate(1 / (rank + 1) for rank in range(len(words)))
+    )
+    users = [
+        str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        for _ in range(args.users)
+    ]
+
+    await Tortoise.init(
+        db_url=f"sqlite://{args.db}",
+        modules={"models": ["models.Task", "models.User"]},
+    )
+    try:
+        conn = connections.get("default")
+        await run_migrations(conn)
+
+        _, rows = await conn.execute_query("SELECT COUNT(*) AS n FROM tasks")
+        if rows[0]["n"] != args.tasks:
+            if rows[0]["n"]:
+                print(f"{args.db} holds {rows[0]['n']} tasks, remove it to reseed")
+                return 2
+            print(f"Seeding {args.tasks} tasks for {args.users} users into {args.db}")
+            started = time.perf_counter()
+            await seed(conn, args.tasks, users, words, cum_weights, rng)
+            print(f"  done in {time.perf_counter() - started:.1f}s")
+
+        service = TaskService(llm_service=None)
+        first_pages, next_pages, hits = [], [], []
+        for _ in range(args.queries):
+            user = rng.choice(users)
+            text = sentence(words, cum_weights, rng.randint(1, 2), rng)
+
+            started = time.perf_counter()
+            matches, cursor = await service.search_tasks(
+                user, text, None, args.page_size
+            )
+            first_pages.append((time.perf_counter() - started) * 1000)
+            hits.append(len(matches))
+
+            if cursor:
+                started = time.perf_counter()
+                await service.search_tasks(user, text, cursor, args.page_size)
+                next_pages.append((time.perf_counter() - started) * 1000)
+
+        print(
+            f"{args.queries} queries, {args.tasks // args.users} tasks per user, "
+            f"{statistics.mean(hits):.1f} results per first page"
+        )
+        for name, samples in (("first page", first_pages), ("next page", next_pages)):
+            if samples:
+                print(
+                    f"  {name:<10}  p50 {percentile(samples, 0.50):6.2f} ms"
+                    f"  p95 {percentile(samples, 0.95):6.2f} ms"
+                    f"  p99 {percentile(samples, 0.99):6.2f} ms"
+                    f"  max {max(samples):6.2f} ms"
+                )
+
+        p95 = percentile(first_pages + next_pages, 0.95)
+        if p95 > args.budget_ms:
+            print(f"FAIL  p95 {p95:.2f} ms exceeds the {args.budget_ms} ms budget")
+            return 1
+        print(f"ok    p95 {p95:.2f} ms within the {args.budget_ms} ms budget")
+        return 0
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text search benchmark.")
+    parser.add_argument("--db", default="search_benchmark.sqlite3")
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,141 @@
+# benchmarks/serialization.py
+#
+# Per-task cost of turning a 10k-task listing into a JSON body, comparing the
+# dicts the controllers used to build inline with the shared serializer, and
+# every JSON backend installed:
+#
+#     python benchmarks/serialization.py --tasks 10000 --repeat 5
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from tortoise import Tortoise  # noqa: E402
+from models.Task import Task  # noqa: E402
+from serializers.task_serializer import (  # noqa: E402
+    JSON_BACKEND,
+    ProjectDTO,
+    json_default,
+    serialize_tasks,
+)
+
+
+def make_tasks(count: int) -> list:
+    """
+    Build tasks as the ORM returns them, without a database round trip.
+    """
+    user_id, parent_id = uuid.uuid4(), uuid.uuid4()
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        Task._init_from_db(
+            id=uuid.uuid4(),
+            title=f"Task {i}",
+            description=f"Description of task {i}, long enough to look realistic.",
+            status="created",
+            created_at=started + timedelta(seconds=i),
+            user_id=user_id,
+            parent_task_id=parent_id,
+            subtask_count=i % 7,
+            path="",
+        )
+        for i in range(count)
+    ]
+
+
+def inline_dicts(tasks: list) -> list:
+    """
+    The dicts TaskController built by hand before the serializer module.
+    """
+    return [
+        {
+            "uuid": str(task.id),
+            "title": task.title,
+            "description": task.description,
+            "user_id": str(task.user_id),
+            "created_at": task.created_at.isoformat(),
+            "subtask_count": task.subtask_count,
+        }
+        for task in tasks
+    ]
+
+
+def encoders() -> dict:
+    """
+    Every installed backend, set up to encode DTOs the way dumps() does.
+    """
+    found = {"json": lambda value: json.dumps(value, default=json_default)}
+    try:
+        import ujson
+
+        found["ujson"] = lambda value: ujson.dumps(value, default=json_default)
+    except ImportError:
+        pass
+    try:
+        import orjson
+
+        found["orjson"] = lambda value: orjson.dumps(value, default=json_default)
+    except ImportError:
+        pass
+    return found
+
+
+def measure(function, repeat: int) -> float:
+    """
+    Best wall time of 'repeat' runs, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def main(count: int, repeat: int) -> None:
+    # The models need an initialized Tortoise to be instantiated
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["models.Task", "models.User"]}
+    )
+    try:
+        tasks = make_tasks(count)
+        print(f"{count} tasks, best of {repeat} runs, default backend: {JSON_BACKEND}")
+
+        def report(name: str, seconds: float) -> None:
+            print(
+                f"  {name:<32} {seconds * 1000:8.2f} ms"
+                f"  {seconds / count * 1e6:6.2f} us/task"
+            )
+
+        report("inline dicts", measure(lambda: inline_dicts(tasks), repeat))
+        report(
+            "inline dicts + json",
+            measure(lambda: json.dumps(inline_dicts(tasks)), repeat),
+        )
+        report(
+            "serialize_tasks",
+            measure(lambda: serialize_tasks(tasks, ProjectDTO), repeat),
+        )
+
+        for name, encode in encoders().items():
+            report(
+                f"serialize_tasks + {name}",
+                measure(lambda: encode(serialize_tasks(tasks, ProjectDTO)), repeat),
+            )
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Task serialization micro-benchmark.")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.tasks, args.repeat))
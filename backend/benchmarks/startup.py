@@ -0,0 +1,163 @@
+# benchmarks/startup.py
+#
+# Cold start of the app: the time to import app.py, and the time from launching
+# app.py to its first HTTP response, both the median of --runs fresh processes.
+# Fails when either exceeds its budget, or when a module that must load lazily
+# is imported at startup:
+#
+#     python benchmarks/startup.py --runs 5 --import-budget 800 --ready-budget 2500
+
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+# Only needed by some requests or some configurations, imported on first use
+LAZY_MODULES = ("mistralai", "httpx", "redis", "sanic_openapi")
+
+
+def server_env(args) -> dict:
+    return dict(
+        os.environ,
+        DATABASE_URI=f"sqlite://{args.db}",
+        REDIS_URI="",
+        MISTRAL_API_KEY="benchmark",
+        SANIC_PORT=str(args.port),
+        SANIC_WORKERS="1",
+        SANIC_DEBUG="False",
+        METRICS_DIR=args.metrics_dir,
+        METRICS_TOKEN="benchmark",  # Measured with metrics on, as deployed
+    )
+
+
+def import_app(args) -> tuple:
+    """
+    Import app.py in a fresh interpreter. Returns the cumulative import time in
+    milliseconds, as reported by -X importtime, and the top-level modules loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=APP_DIR,
+        env=server_env(args),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    # "import time: self [us] | cumulative | imported package", app comes last
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(cumulative) / 1000
+    return modules["app"], set(modules)
+
+
+def first_response(args) -> float:
+    """
+    Launch app.py and poll it until it answers. Returns the milliseconds taken.
+    """
+    url = f"http://127.0.0.1:{args.port}/"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "app.py"],
+        cwd=APP_DIR,
+        env=server_env(args),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(url, timeout=1).read()
+                break
+            except urllib.error.HTTPError:
+                break  # Any response will do, the route requires a token
+            except OSError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("The server exited before answering")
+            if time.perf_counter() - started > args.timeout:
+                raise RuntimeError("The server did not start")
+            time.sleep(0.01)
+        return (time.perf_counter() - started) * 1000
+    finally:
+        # Sanic's main process ignores signals until it has seen its worker
+        # start, which may come after the first response: stop them all at once
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+
+def main(args) -> int:
+    # Workers killed while starting leave their metrics behind
+    args.metrics_dir = tempfile.mkdtemp(prefix="startup-benchmark-metrics-")
+    try:
+        return measure(args)
+    finally:
+        shutil.rmtree(args.metrics_dir, ignore_errors=True)
+
+
+def measure(args) -> int:
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    subprocess.run(
+        [sys.executable, "migrate.py"],
+        cwd=APP_DIR,
+        env=server_env(args),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    import_times, ready_times, loaded = [], [], set()
+    for _ in range(args.runs):
+        import_time, modules = import_app(args)
+        import_times.append(import_time)
+        loaded |= modules
+        ready_times.append(first_response(args))
+
+    import_ms = statistics.median(import_times)
+    ready_ms = statistics.median(ready_times)
+    eager = sorted(module for module in LAZY_MODULES if module in loaded)
+
+    print(f"Median of {args.runs} runs")
+    print(f"  import app:     {import_ms:7.0f} ms  (budget {args.import_budget} ms)")
+    print(f"  first response: {ready_ms:7.0f} ms  (budget {args.ready_budget} ms)")
+
+    failed = False
+    if import_ms > args.import_budget:
+        print("Importing the app exceeds its budget")
+        failed = True
+    if ready_ms > args.ready_budget:
+        print("The first response exceeds its budget")
+        failed = True
+    if eager:
+        print(f"Imported at startup instead of on first use: {', '.join(eager)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import and startup time budgets.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=800.0)
+    parser.add_argument("--ready-budget", type=float, default=2500.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8030)
+    parser.add_argument(
+        "--db", default=os.path.join(tempfile.gettempdir(), "startup_benchmark.sqlite3")
+    )
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)  # The server runs from the app directory
+
+    sys.exit(main(args))
@@ -0,0 +1,179 @@
+# benchmarks/throughput.py
+#
+# Requests per second served by the app for each Sanic worker count. Boots
+# app.py on a seeded SQLite database, then keeps --concurrency clients polling
+# /projects and /tasks/<task_id> for --duration seconds:
+#
+#     python benchmarks/throughput.py --workers 1,2,4 --concurrency 32 --duration 10
+#
+# SQLite serializes writes, so only reads are measured.
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import aiohttp
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+ROOT_TASK_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def server_env(args, workers: int) -> dict:
+    return dict(
+        os.environ,
+        DATABASE_URI=f"sqlite://{args.db}",
+        REDIS_URI="",
+        MISTRAL_API_KEY="benchmark",
+        SANIC_PORT=str(args.port),
+        SANIC_WORKERS=str(workers),
+        SANIC_DEBUG="False",
+        METRICS_TOKEN="benchmark",  # Measured with metrics on, as deployed
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                # Any response will do, the route may require a token
+                async with session.get(f"{base_url}/"):
+                    return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("The server did not start")
+            await asyncio.sleep(0.2)
+
+
+async def seed(base_url: str, db_path: str, projects: int) -> tuple:
+    """
+    Register a user and give them projects with a few subtasks each.
+    """
+    async with aiohttp.ClientSession() as session:
+        credentials = {"username": "bench", "email": "bench@example.com"}
+        async with session.post(
+            f"{base_url}/auth/register", json={**credentials, "password": "bench"}
+        ) as response:
+            data = await response.json()
+        token, user_id = data["token"], data["user"]["uuid"]
+
+        # Projects hang off the sentinel root task, which must exist
+        with sqlite3.connect(db_path) as db:
+            db.execute(
+                "INSERT OR IGNORE INTO tasks (id, title, status, created_at, user_id, "
+                "subtask_count, path) VALUES (?, 'root', 'created', "
+                "CURRENT_TIMESTAMP, ?, 0, '')",
+                [ROOT_TASK_ID, user_id],
+            )
+
+        headers = {"Authorization": f"Bearer {token}"}
+        operations = [
+            {"op": "create", "title": f"Project {i}", "description": "benchmark"}
+            for i in range(projects)
+        ]
+        async with session.post(
+            f"{base_url}/tasks/batch", json={"operations": operations}, headers=headers
+        ) as response:
+            results = (await response.json())["results"]
+        task_ids = [result["task"]["uuid"] for result in results]
+
+        operations = [
+            {"op": "create", "title": f"Step {i}", "parent_uuid": task_id}
+            for task_id in task_ids
+            for i in range(5)
+        ]
+        async with session.post(
+            f"{base_url}/tasks/batch", json={"operations": operations}, headers=headers
+        ) as response:
+            await response.read()
+
+    return token, task_ids
+
+
+async def client(base_url: str, token: str, task_ids: list, until: float) -> list:
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = ["/projects"] + [f"/tasks/{task_id}" for task_id in task_ids]
+    async with aiohttp.ClientSession(headers=headers) as session:
+        i = 0
+        while time.monotonic() < until:
+            started = time.perf_counter()
+            async with session.get(base_url + paths[i % len(paths)]) as response:
+                await response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"{paths[i % len(paths)]}: {response.status}")
+            latencies.append(time.perf_counter() - started)
+            i += 1
+    return latencies
+
+
+async def measure(args, workers: int, token: str, task_ids: list) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    until = time.monotonic() + args.duration
+    results = await asyncio.gather(
+        *(client(base_url, token, task_ids, until) for _ in range(args.concurrency))
+    )
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": len(latencies) / args.duration,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+async def main(args) -> None:
+    db_path = args.db
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    subprocess.run(
+        [sys.executable, "migrate.py"],
+        cwd=APP_DIR,
+        env=server_env(args, 1),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    token = task_ids = None
+    print(f"{args.concurrency} clients for {args.duration}s per run")
+    for workers in [int(count) for count in args.workers.split(",")]:
+        server = subprocess.Popen(
+            [sys.executable, "app.py"],
+            cwd=APP_DIR,
+            env=server_env(args, workers),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            await wait_until_ready(base_url)
+            if token is None:
+                token, task_ids = await seed(base_url, db_path, args.projects)
+
+            result = await measure(args, workers, token, task_ids)
+            print(
+                f"  {workers} worker(s): {result['rps']:8.0f} req/s"
+                f"  p50 {result['p50_ms']:6.1f} ms  p99 {result['p99_ms']:6.1f} ms"
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput per worker count.")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--db", default="throughput_benchmark.sqlite3")
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)  # The server runs from the app directory
+
+    asyncio.run(main(args))
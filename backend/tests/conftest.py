@@ -0,0 +1,48 @@
+# tests/conftest.py
+#
+# The services run against a fresh in-memory SQLite database per test, without
+# Redis or Mistral. Tests are plain functions that drive their scenario with
+# run_scenario, so no asyncio plugin is needed:
+#
+#     python -m pytest tests
+
+import asyncio
+import os
+import sys
+
+os.environ["DATABASE_URI"] = "sqlite://:memory:"
+os.environ["REDIS_URI"] = ""
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from tortoise import connections  # noqa: E402
+from connections.database import close_database, init_database  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models.Task import ROOT_TASK_ID  # noqa: E402
+from models.User import User  # noqa: E402
+
+
+def run_scenario(scenario):
+    """
+    Run scenario(user) on a migrated database holding one user and the root of
+    all projects, and return what it returns.
+    """
+
+    async def main():
+        await init_database()
+        try:
+            conn = connections.get("default")
+            await run_migrations(conn)
+            user = await User.create(
+                display_name="Test", email="test@example.com", password="unused"
+            )
+            await conn.execute_query(
+                "INSERT INTO tasks (id, title, status, created_at, user_id, "
+                "subtask_count, path) VALUES (?, 'root', 'created', "
+                "CURRENT_TIMESTAMP, ?, 0, '')",
+                [ROOT_TASK_ID, str(user.uuid)],
+            )
+            return await scenario(user)
+        finally:
+            await close_database(5)
+
+    return asyncio.run(main())
@@ -0,0 +1,122 @@
+# tests/test_task_service.py
+
+import asyncio
+from conftest import run_scenario
+from connections.database import observe_queries
+from models.Task import ROOT_TASK_ID, Task
+from services.cache_service import CacheService
+from services.task_service import TaskService
+
+# SQL statements sent so far, by every test of this module
+statements = []
+observed = False
+
+
+def count_statements() -> None:
+    global observed
+    if not observed:
+        observe_queries(lambda query, seconds, failed: statements.append(query))
+        observed = True
+
+
+async def create_projects(service: TaskService, user, count: int) -> list:
+    return [
+        await service.create_task(f"Project {i}", None, user.uuid)
+        for i in range(count)
+    ]
+
+
+def test_batch_moves_send_a_constant_number_of_statements():
+    async def scenario(user):
+        service = TaskService(llm_service=None)
+        count_statements()
+
+        sent = []
+        for moves in (1, 5, 20):
+            projects = await create_projects(service, user, moves + 1)
+            for project in projects[1:]:
+                await service.create_task("Subtask", None, user.uuid, project.id)
+            target = projects[0]
+
+            before = len(statements)
+            results = await service.apply_batch(
+                user.uuid,
+                [
+                    {
+                        "op": "update",
+                        "uuid": str(project.id),
+                        "parent_uuid": str(target.id),
+                    }
+                    for project in projects[1:]
+                ],
+            )
+            sent.append(len(statements) - before)
+            assert [result["status"] for result in results] == [200] * moves
+        return sent
+
+    one, five, twenty = run_scenario(scenario)
+    assert one == five == twenty
+
+
+def test_batch_chained_moves_rewrite_every_path():
+    async def scenario(user):
+        service = TaskService(llm_service=None)
+        a, b, c = await create_projects(service, user, 3)
+        child = await service.create_task("Child", None, user.uuid, b.id)
+        grandchild = await service.create_task("Grandchild", None, user.uuid, child.id)
+
+        # b goes under a, then a under c: b's subtree follows both moves
+        results = await service.apply_batch(
+            user.uuid,
+            [
+                {"op": "update", "uuid": str(b.id), "parent_uuid": str(a.id)},
+                {"op": "update", "uuid": str(a.id), "parent_uuid": str(c.id)},
+            ],
+        )
+        assert [result["status"] for result in results] == [200, 200]
+
+        tasks = {task.id: task for task in await Task.exclude(id=ROOT_TASK_ID)}
+        for task in tasks.values():
+            parent = tasks.get(task.parent_task_id)
+            expected = service._child_path(parent.path if parent else "", task.id)
+            assert task.path == expected
+        assert tasks[grandchild.id].path.startswith(tasks[c.id].path)
+
+    run_scenario(scenario)
+
+
+class PausingCache(CacheService):
+    """
+    A local cache whose next set() waits until 'resume' is set.
+    """
+
+    def __init__(self):
+        super().__init__(redis=None)
+        self.paused = asyncio.Event()
+        self.resume = None
+
+    async def set(self, *args, **kwargs):
+        if self.resume is not None:
+            resume, self.resume = self.resume, None
+            self.paused.set()
+            await resume.wait()
+        await super().set(*args, **kwargs)
+
+
+def test_read_overlapping_a_write_does_not_cache_the_old_row():
+    async def scenario(user):
+        cache = PausingCache()
+        service = TaskService(llm_service=None, cache=cache)
+        task = await service.create_task("old title", None, user.uuid)
+
+        # The read loads the row, then the write commits before it is cached
+        resume = cache.resume = asyncio.Event()
+        read = asyncio.create_task(service.get_task_by_id(task.id, user.uuid))
+        await cache.paused.wait()
+        await service.update_task(task.id, user.uuid, {"title": "new title"})
+        resume.set()
+        assert (await read).title == "old title"
+
+        return (await service.get_task_by_id(task.id, user.uuid)).title
+
+    assert run_scenario(scenario) == "new title"
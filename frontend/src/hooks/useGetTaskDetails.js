@@ -7,7 +7,19 @@ export const useGetTaskDetails = (taskId) => {
     return useQuery({
         queryKey: ['taskDetails', taskId], // queryKey as an array
         queryFn: async () => {
-            const { data } = await axiosInstance.get(`/tasks/${taskId}`); // Use axiosInstance to fetch task details
+            const params = { page_size: 100 };
+            const { data } = await axiosInstance.get(`/tasks/${taskId}`, { params }); // Use axiosInstance to fetch task details
+
+            // Subtasks are paginated, follow the cursor until every page is loaded
+            let nextCursor = data.next_cursor;
+            while (nextCursor) {
+                const { data: page } = await axiosInstance.get(`/tasks/${taskId}`, {
+                    params: { ...params, cursor: nextCursor },
+                });
+                data.subtasks.push(...page.subtasks);
+                nextCursor = page.next_cursor;
+            }
+
             return data; // Return task details
         },
     });